@@ -0,0 +1,10 @@
+"""Métricas do motor de fluxos n8n.
+
+Reads the finished executions of the flow engine workflow from the n8n API
+and reports one tick per execution through record_flow_engine_tick()
+(migration 0038), next to the SQL engine's own ticks. See
+flowmetrics/README.md.
+"""
+from .collector import Collector, N8nClient, SupabaseClient, build_tick
+
+__all__ = ['Collector', 'N8nClient', 'SupabaseClient', 'build_tick']
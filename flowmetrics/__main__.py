@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""CLI: python -m flowmetrics [opções]
+
+Grava em sp3_flow_engine_ticks (engine='n8n') um tick por execução do
+workflow do motor de fluxos que ainda não foi registrada. Feito para rodar
+a cada minuto (cron); cada chamada continua de onde a anterior parou.
+"""
+import argparse
+import json
+import os
+import sys
+
+from .collector import ENGINE_WORKFLOW_ID, Collector, N8nClient, SupabaseClient
+
+
+def _print_tick(tick):
+    print('%s  %s  %8.1f ms  %d execuções%s'
+          % (tick['source_id'], tick['tick_at'], tick['duration_ms'], len(tick['claimed_ids']),
+             '  OVERRUN' if tick['overrun'] else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m flowmetrics', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n8n-url', default=os.environ.get('N8N_URL'), help='default: $N8N_URL')
+    parser.add_argument('--n8n-api-key', default=os.environ.get('N8N_API_KEY'), help='default: $N8N_API_KEY')
+    parser.add_argument('--supabase-url', default=os.environ.get('SUPABASE_URL'), help='default: $SUPABASE_URL')
+    parser.add_argument('--service-key', default=os.environ.get('SUPABASE_SERVICE_ROLE_KEY'),
+                        help='default: $SUPABASE_SERVICE_ROLE_KEY')
+    parser.add_argument('--workflow', default=ENGINE_WORKFLOW_ID, help='id do workflow do motor')
+    parser.add_argument('--claim-node',
+                        help='nó cuja saída são as linhas de sp3_flow_executions pegas no tick '
+                             '(default: detecta pelo formato dos itens)')
+    parser.add_argument('--limit', type=int, default=500, help='máximo de execuções por chamada')
+    parser.add_argument('--dry-run', action='store_true', help='mostra os ticks sem gravar')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado final em JSON')
+    args = parser.parse_args(argv)
+
+    missing = [name for name, value in (('--n8n-url', args.n8n_url), ('--n8n-api-key', args.n8n_api_key),
+                                        ('--supabase-url', args.supabase_url), ('--service-key', args.service_key))
+               if not value]
+    if missing:
+        parser.error('faltando: %s' % ', '.join(missing))
+
+    collector = Collector(
+        N8nClient(args.n8n_url, args.n8n_api_key),
+        SupabaseClient(args.supabase_url, args.service_key),
+        workflow_id=args.workflow,
+        claim_node=args.claim_node,
+        limit=args.limit,
+    )
+    result = collector.run(dry_run=args.dry_run, on_tick=None if args.json else _print_tick)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(' '.join('%s=%s' % kv for kv in result.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Turns executions of the n8n flow engine into sp3_flow_engine_ticks rows.
+
+The engine workflow (KWbbXXwCMorQDLqd) runs once per minute; each finished
+execution is one tick. Per-node timings come from the execution runData
+(n8n public API, includeData=true). Counts come from the ids of the
+sp3_flow_executions rows the tick claimed: record_flow_engine_tick()
+(migration 0038) looks up how each one ended. Only the standard library.
+"""
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+ENGINE_WORKFLOW_ID = 'KWbbXXwCMorQDLqd'
+
+# Intervalo do Schedule Trigger do motor: tick mais longo que isso é overrun
+TICK_INTERVAL_MS = 60000
+
+# Fase (phase_ms) por tipo de nó do n8n
+PHASES = {
+    'n8n-nodes-base.httpRequest': 'http',
+    'n8n-nodes-base.postgres': 'db',
+    'n8n-nodes-base.supabase': 'db',
+    'n8n-nodes-base.code': 'code',
+    'n8n-nodes-base.function': 'code',
+    'n8n-nodes-base.functionItem': 'code',
+}
+
+FINISHED = ('success', 'error', 'crashed', 'canceled')
+
+
+def _request(url, headers, body=None, timeout=30.0):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers=headers, method='POST' if data else 'GET')
+    if data:
+        req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw = resp.read()
+    except urllib.error.HTTPError as e:
+        raise RuntimeError('%s %s: %s' % (e.code, url, e.read()[:300].decode('utf-8', 'replace')))
+    return json.loads(raw) if raw else None
+
+
+def _ms(ts):
+    """ISO timestamp (n8n) -> epoch ms."""
+    return datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp() * 1000
+
+
+class N8nClient:
+    """n8n public API (Settings > n8n API)."""
+
+    def __init__(self, url, api_key):
+        self.url = url.rstrip('/')
+        self.headers = {'X-N8N-API-KEY': api_key, 'Accept': 'application/json'}
+
+    def workflow(self, workflow_id):
+        return _request('%s/api/v1/workflows/%s' % (self.url, workflow_id), self.headers)
+
+    def executions(self, workflow_id, after_id=None, limit=500):
+        """Executions newer than after_id, oldest first (at most `limit`)."""
+        found = []
+        cursor = None
+        while len(found) < limit:
+            params = {'workflowId': workflow_id, 'includeData': 'true', 'limit': min(100, limit)}
+            if cursor:
+                params['cursor'] = cursor
+            page = _request('%s/api/v1/executions?%s' % (self.url, urllib.parse.urlencode(params)),
+                            self.headers)
+            # A API devolve do mais novo para o mais antigo
+            for e in page.get('data', []):
+                if after_id is not None and int(e['id']) <= int(after_id):
+                    return list(reversed(found))
+                found.append(e)
+            cursor = page.get('nextCursor')
+            if not cursor:
+                break
+        return list(reversed(found[:limit]))
+
+
+class SupabaseClient:
+    """PostgREST with the service role key (RLS de sp3_flow_engine_ticks)."""
+
+    def __init__(self, url, service_key):
+        self.url = url.rstrip('/')
+        self.headers = {'apikey': service_key, 'Authorization': 'Bearer %s' % service_key}
+
+    def last_source_id(self):
+        rows = _request(
+            '%s/rest/v1/sp3_flow_engine_ticks?select=source_id&engine=eq.n8n'
+            '&source_id=not.is.null&order=tick_at.desc&limit=1' % self.url,
+            self.headers,
+        )
+        return rows[0]['source_id'] if rows else None
+
+    def record_tick(self, stats):
+        _request('%s/rest/v1/rpc/record_flow_engine_tick' % self.url, self.headers, {'p_stats': stats})
+
+
+def _output_items(runs):
+    for run in runs or []:
+        for output in (run.get('data') or {}).get('main') or []:
+            for item in output or []:
+                yield item.get('json') or {}
+
+
+def find_claim_node(run_data):
+    """First node whose output looks like sp3_flow_executions rows."""
+    for name, runs in run_data.items():
+        for item in _output_items(runs):
+            if 'current_node_id' in item and 'flow_id' in item and 'id' in item:
+                return name
+            break
+    return None
+
+
+def build_tick(execution, node_types, claim_node=None, previous_stop_ms=None):
+    """Stats dict for record_flow_engine_tick(), or None if still running."""
+    if execution.get('status') not in FINISHED or not execution.get('stoppedAt'):
+        return None
+
+    started_ms = _ms(execution['startedAt'])
+    duration_ms = max(0.0, _ms(execution['stoppedAt']) - started_ms)
+    run_data = ((execution.get('data') or {}).get('resultData') or {}).get('runData') or {}
+
+    node_stats = {}
+    phase_ms = {}
+    for name, runs in run_data.items():
+        phase = PHASES.get(node_types.get(name), 'other')
+        for run in runs or []:
+            ms = float(run.get('executionTime') or 0)
+            s = node_stats.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            s['count'] += 1
+            s['total_ms'] = round(s['total_ms'] + ms, 3)
+            s['max_ms'] = round(max(s['max_ms'], ms), 3)
+            phase_ms[phase] = round(phase_ms.get(phase, 0.0) + ms, 3)
+
+    claim_node = claim_node or find_claim_node(run_data)
+    claimed_ids = []
+    max_lag_ms = 0.0
+    for item in _output_items(run_data.get(claim_node)):
+        if item.get('id') is None:
+            continue
+        claimed_ids.append(int(item['id']))
+        try:
+            max_lag_ms = max(max_lag_ms, started_ms - _ms(item['next_run_at']))
+        except (KeyError, TypeError, ValueError):
+            # Nó de busca sem next_run_at (ou em formato que o Python não lê)
+            pass
+
+    overrun = duration_ms > TICK_INTERVAL_MS or (
+        previous_stop_ms is not None and started_ms < previous_stop_ms)
+
+    return {
+        'source_id': str(execution['id']),
+        'tick_at': execution['startedAt'],
+        'duration_ms': round(duration_ms, 3),
+        'claimed_ids': sorted(set(claimed_ids)),
+        'max_lag_ms': round(max_lag_ms, 3),
+        'overrun': overrun,
+        'node_stats': node_stats,
+        'phase_ms': phase_ms,
+    }
+
+
+class Collector:
+    """Records every finished engine execution not yet in sp3_flow_engine_ticks.
+
+    >>> Collector(N8nClient(n8n_url, key), SupabaseClient(sb_url, service_key)).run()
+    {'recorded': 3, 'last_source_id': '48214', ...}
+    """
+
+    def __init__(self, n8n, supabase, workflow_id=ENGINE_WORKFLOW_ID, claim_node=None, limit=500):
+        self.n8n = n8n
+        self.supabase = supabase
+        self.workflow_id = workflow_id
+        self.claim_node = claim_node
+        self.limit = limit
+
+    def run(self, dry_run=False, on_tick=None):
+        node_types = {n['name']: n['type'] for n in self.n8n.workflow(self.workflow_id).get('nodes', [])}
+        last = self.supabase.last_source_id()
+        executions = self.n8n.executions(self.workflow_id, after_id=last, limit=self.limit)
+
+        recorded = 0
+        previous_stop_ms = None
+        for execution in executions:
+            tick = build_tick(execution, node_types, self.claim_node, previous_stop_ms)
+            # Execução ainda rodando: para aqui e retoma dela na próxima chamada
+            if tick is None:
+                break
+            if not dry_run:
+                self.supabase.record_tick(tick)
+            recorded += 1
+            last = tick['source_id']
+            previous_stop_ms = _ms(execution['stoppedAt'])
+            if on_tick:
+                on_tick(tick)
+
+        return {'recorded': recorded, 'pending': len(executions) - recorded, 'last_source_id': last}
@@ -36,6 +36,7 @@ const LazySignupView = lazy(() => import('./components/SignupView'));
 const LazyBlockedView = lazy(() => import('./components/BlockedView'));
 import { supabase } from './lib/supabase';
 import type { Lead, UserProfile, SubscriptionStatus } from './lib/supabase';
+import { loadTenantBootstrap, subscribeTenantBootstrap, clearTenantBootstrap } from './lib/bootstrap';
 
 const SidebarItem = ({ icon: Icon, label, active, onClick }: { icon: any, label: string, active?: boolean, onClick?: () => void }) => (
   <button
@@ -221,31 +222,29 @@ function App() {
 
   // ─── AUTENTICAÇÃO ───────────────────────────────────────────────────────────
   const loadUserProfile = async (userId: string, _userEmail: string) => {
-    const { data, error } = await supabase
-      .from('sp3_users')
-      .select('*, sp3_companies(name)')
-      .eq('id', userId)
-      .maybeSingle();
-
-    if (error) {
+    // Perfil vem do bundle de bootstrap (cacheado; ver lib/bootstrap.ts)
+    let bootstrap;
+    try {
+      bootstrap = await loadTenantBootstrap();
+    } catch (error) {
       console.error('Erro ao carregar perfil:', error);
       setAuthLoading(false);
       return;
     }
 
-    if (data) {
-      const { sp3_companies, ...userData } = data as any;
+    if (bootstrap?.user) {
+      const { company_name, ...userData } = bootstrap.user as any;
       
-      const userPerms = userData.permissions || {};
+      const userPerms = { ...(userData.permissions || {}) };
       // Master users always get full permissions
       if (userData.role === 'master') {
-        userPerms.dashboard = true;
-        userPerms.chats = true;
-        userPerms.kanban = true;
-        userPerms.leads = true;
-        userPerms.settings = true;
-        userPerms.calendar = true;
-        supabase.from('sp3_users').update({ permissions: userPerms }).eq('id', userId).then();
+        const fullPerms = ['dashboard', 'chats', 'kanban', 'leads', 'settings', 'calendar'];
+        // Só grava se faltava alguma: cada UPDATE em sp3_users invalida o bootstrap da empresa
+        const missing = fullPerms.some(p => userPerms[p] !== true);
+        fullPerms.forEach(p => { userPerms[p] = true; });
+        if (missing) {
+          supabase.from('sp3_users').update({ permissions: userPerms }).eq('id', userId).then();
+        }
       } else if (userPerms.calendar === undefined) {
         userPerms.calendar = true;
         supabase.from('sp3_users').update({ permissions: userPerms }).eq('id', userId).then();
@@ -254,7 +253,7 @@ function App() {
       setAuthUser({
         ...userData,
         permissions: userPerms,
-        company_name: sp3_companies?.name || ''
+        company_name: company_name || ''
       } as UserProfile);
 
       // Verificar status da assinatura
@@ -289,6 +288,7 @@ function App() {
         setShowSignup(false);
         loadUserProfile(session.user.id, session.user.email || '');
       } else if (event === 'SIGNED_OUT') {
+        clearTenantBootstrap();
         setAuthUser(null);
         setSubscriptionStatus(null);
         setAuthLoading(false);
@@ -333,11 +333,64 @@ function App() {
     }
   };
 
+  // Bundle de bootstrap: rebusca só quando a versão da empresa muda
+  useEffect(() => {
+    if (!authUser || !effectiveCompanyId) return;
+    return subscribeTenantBootstrap(effectiveCompanyId);
+  }, [authUser?.id, effectiveCompanyId]);
+
   useEffect(() => {
     if (!authUser || !effectiveCompanyId) return;
     fetchLeads();
 
-    // Realtime: novos leads aparecem instantaneamente
+    // Realtime: novos leads aparecem instantaneamente. INSERT/UPDATE passam por
+    // um buffer: uma importação em massa (leadimport) gera um evento por linha,
+    // e aplicar cada um no estado seria O(n) por evento em toda aba aberta.
+    // Rajada grande vira um único fetchLeads() quando os eventos param.
+    const BURST_LIMIT = 50;
+    let pendingInserts: Lead[] = [];
+    let pendingUpdates = new Map<number, Lead>();
+    let overflow = false;
+    let flushTimer: ReturnType<typeof setTimeout> | null = null;
+
+    const flushLeadEvents = () => {
+      flushTimer = null;
+      const inserts = pendingInserts;
+      const updates = pendingUpdates;
+      const refetch = overflow;
+      pendingInserts = [];
+      pendingUpdates = new Map();
+      overflow = false;
+
+      if (refetch) {
+        fetchLeads();
+        return;
+      }
+      setLeads(prev => {
+        const known = new Set(prev.map(l => l.id));
+        const fresh = inserts.filter(l => !known.has(l.id)).map(l => updates.get(l.id) || l).reverse();
+        const merged = updates.size ? prev.map(l => updates.get(l.id) || l) : prev;
+        return fresh.length ? [...fresh, ...merged].slice(0, 2000) : merged;
+      });
+      if (inserts.length) {
+        setLastSync(new Date().toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' }));
+      }
+    };
+
+    const queueLeadEvent = (apply: () => void) => {
+      if (!overflow) {
+        apply();
+        overflow = pendingInserts.length + pendingUpdates.size > BURST_LIMIT;
+        if (overflow) {
+          pendingInserts = [];
+          pendingUpdates = new Map();
+        }
+      }
+      // Debounce: durante a rajada nada é aplicado (o polling de 10s segue rodando)
+      if (flushTimer) clearTimeout(flushTimer);
+      flushTimer = setTimeout(flushLeadEvents, 500);
+    };
+
     const channel = supabase
       .channel(`leads-${effectiveCompanyId}`)
       .on('postgres_changes', {
@@ -347,11 +400,7 @@ function App() {
         filter: `company_id=eq.${effectiveCompanyId}`
       }, (payload) => {
         const newLead = payload.new as Lead;
-        setLeads(prev => {
-          if (prev.some(l => l.id === newLead.id)) return prev;
-          return [newLead, ...prev];
-        });
-        setLastSync(new Date().toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' }));
+        queueLeadEvent(() => { pendingInserts.push(newLead); });
       })
       .on('postgres_changes', {
         event: 'UPDATE',
@@ -360,7 +409,7 @@ function App() {
         filter: `company_id=eq.${effectiveCompanyId}`
       }, (payload) => {
         const updated = payload.new as Lead;
-        setLeads(prev => prev.map(l => l.id === updated.id ? updated : l));
+        queueLeadEvent(() => { pendingUpdates.set(updated.id, updated); });
       })
       .on('postgres_changes', {
         event: 'DELETE',
@@ -392,6 +441,7 @@ function App() {
     const interval = setInterval(fetchLeads, 10000);
     return () => {
       clearInterval(interval);
+      if (flushTimer) clearTimeout(flushTimer);
       supabase.removeChannel(channel);
     };
   }, [authUser, effectiveCompanyId]);
@@ -7,6 +7,7 @@ import { format, isToday, isYesterday, isSameDay, isPast } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 import { supabase } from '../lib/supabase';
 import type { Lead, UserProfile, QuickMessage, FlowDefinition, FlowExecution } from '../lib/supabase';
+import { useTenantBootstrap } from '../lib/bootstrap';
 
 interface ChatViewProps {
     initialLeads: Lead[];
@@ -118,15 +119,16 @@ const ChatView = ({ initialLeads, authUser, openPhone, onPhoneOpened, readOnly =
     const [selectedCloseReason, setSelectedCloseReason] = useState<string>('');
 
 
+    // Config da empresa (motivos, instância, mensagens rápidas, fluxos) vem do
+    // bundle de bootstrap em cache, atualizado via realtime quando muda
+    const bootstrap = useTenantBootstrap(authUser.company_id);
+
     useEffect(() => {
-        const fetchReasons = async () => {
-            const { data } = await supabase.from('sp3_companies').select('closing_reasons').eq('id', authUser.company_id).single();
-            if (data?.closing_reasons && data.closing_reasons.length > 0) {
-                setClosingReasons(data.closing_reasons);
-            }
-        };
-        fetchReasons();
-    }, [authUser.company_id]);
+        const reasons = bootstrap?.company.closing_reasons;
+        if (reasons && reasons.length > 0) {
+            setClosingReasons(reasons);
+        }
+    }, [bootstrap]);
 
 
     const handleSaveName = async () => {
@@ -324,23 +326,16 @@ const ChatView = ({ initialLeads, authUser, openPhone, onPhoneOpened, readOnly =
 
     // Carregar instância ativa da Evolution API
     useEffect(() => {
-        const loadInstance = async () => {
-            const { data } = await supabase
-                .from('sp3_instances')
-                .select('evo_api_url, evo_api_key, instance_name')
-                .eq('company_id', authUser.company_id)
-                .eq('is_active', true)
-                .maybeSingle();
-
-            if (data) {
-                setEvoInstance(data);
-            } else {
-                console.warn('Nenhuma instância WhatsApp ativa encontrada. Configure uma instância em Configurações > WhatsApp.');
-                setEvoInstance(null);
-            }
-        };
-        loadInstance();
-    }, []);
+        if (!bootstrap) return;
+        if (bootstrap.instance) {
+            // Cópia do localStorage vem sem a chave: espera a validação do bundle
+            const { evo_api_key } = bootstrap.instance;
+            if (evo_api_key) setEvoInstance({ ...bootstrap.instance, evo_api_key });
+        } else {
+            console.warn('Nenhuma instância WhatsApp ativa encontrada. Configure uma instância em Configurações > WhatsApp.');
+            setEvoInstance(null);
+        }
+    }, [bootstrap]);
 
     // 1. SINCRONIZAR LEADS LOCAIS
     useEffect(() => {
@@ -402,12 +397,8 @@ const ChatView = ({ initialLeads, authUser, openPhone, onPhoneOpened, readOnly =
 
 
     useEffect(() => {
-        const fetchQuickMessages = async () => {
-            const { data } = await supabase.from('sp3_quick_messages').select('*').eq('company_id', authUser.company_id);
-            if (data) setQuickMessages(data as QuickMessage[]);
-        };
-        fetchQuickMessages();
-    }, []);
+        if (bootstrap) setQuickMessages(bootstrap.quick_messages);
+    }, [bootstrap]);
 
     const handleDownloadMedia = async (url: string, type: 'image' | 'video' | 'audio') => {
         try {
@@ -719,15 +710,9 @@ const ChatView = ({ initialLeads, authUser, openPhone, onPhoneOpened, readOnly =
 
     // ─── Visual Flows: fetch available flows + active execution ─────────────
     useEffect(() => {
-        if (!authUser.company_id) return;
-        supabase
-            .from('sp3_flows')
-            .select('id, name, trigger_type, is_active')
-            .eq('company_id', authUser.company_id)
-            .eq('is_active', true)
-            .eq('trigger_type', 'manual')
-            .then(({ data }) => { if (data) setCompanyFlows(data as FlowDefinition[]); });
-    }, [authUser.company_id]);
+        if (!bootstrap) return;
+        setCompanyFlows(bootstrap.flows.filter(f => f.trigger_type === 'manual') as FlowDefinition[]);
+    }, [bootstrap]);
 
     useEffect(() => {
         if (!selectedLead || !authUser.company_id) { setActiveFlowExec(null); return; }
@@ -247,6 +247,8 @@ export default function InstagramView({ authUser, readOnly: _readOnly = false }:
       post_thumbnail_url: '',
       post_caption: '',
       keyword: '',
+      match_mode: 'contains',
+      dedupe_window_minutes: 1440,
       active: true,
       reply_comment: true,
       reply_comment_text: 'Te mandei no Direct! 🔥',
@@ -320,6 +322,8 @@ export default function InstagramView({ authUser, readOnly: _readOnly = false }:
         post_thumbnail_url: editingAutomation.post_thumbnail_url || '',
         post_caption: editingAutomation.post_caption || '',
         keyword: editingAutomation.keyword!.trim().toUpperCase(),
+        match_mode: editingAutomation.match_mode || 'contains',
+        dedupe_window_minutes: editingAutomation.dedupe_window_minutes ?? 1440,
         active: editingAutomation.active ?? true,
         reply_comment: editingAutomation.reply_comment ?? true,
         reply_comment_text: editingAutomation.reply_comment_text || 'Te mandei no Direct! 🔥'
@@ -872,8 +876,38 @@ export default function InstagramView({ authUser, readOnly: _readOnly = false }:
                 }}
               />
               <p style={{ fontSize: '0.72rem', color: 'var(--text-muted)', marginTop: '4px' }}>
-                Quando alguém comentar esta palavra no post, a DM será enviada
+                Quando alguém comentar esta palavra no post, a DM será enviada (maiúsculas e acentos são ignorados)
               </p>
+              <label style={{
+                display: 'flex', alignItems: 'center', gap: '8px', cursor: 'pointer',
+                fontSize: '0.8rem', fontWeight: '600', marginTop: '8px'
+              }}>
+                <input
+                  type="checkbox"
+                  checked={editingAutomation.match_mode === 'whole_word'}
+                  onChange={(e) => setEditingAutomation({ ...editingAutomation, match_mode: e.target.checked ? 'whole_word' : 'contains' })}
+                  style={{ accentColor: 'var(--accent)' }}
+                />
+                Só a palavra inteira (EU não dispara em "MEU")
+              </label>
+              <div style={{ display: 'flex', alignItems: 'center', gap: '8px', marginTop: '8px', fontSize: '0.8rem', color: 'var(--text-secondary)' }}>
+                Mesma pessoa recebe a DM de novo após
+                <select
+                  value={editingAutomation.dedupe_window_minutes ?? 1440}
+                  onChange={(e) => setEditingAutomation({ ...editingAutomation, dedupe_window_minutes: Number(e.target.value) })}
+                  style={{
+                    padding: '4px 8px', borderRadius: '8px',
+                    border: '1px solid var(--border)', background: 'var(--bg-primary)',
+                    fontSize: '0.8rem', outline: 'none', color: 'var(--text-primary)'
+                  }}
+                >
+                  <option value={0}>qualquer comentário</option>
+                  <option value={60}>1 hora</option>
+                  <option value={1440}>24 horas</option>
+                  <option value={10080}>7 dias</option>
+                  <option value={43200}>30 dias</option>
+                </select>
+              </div>
             </div>
 
             {/* Post selecionado */}
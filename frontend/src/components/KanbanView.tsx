@@ -2,6 +2,7 @@ import { useState, useEffect, useMemo, Component } from 'react';
 import type { ReactNode, ErrorInfo } from 'react';
 import { supabase } from '../lib/supabase';
 import type { UserProfile } from '../lib/supabase';
+import { getCachedBootstrap } from '../lib/bootstrap';
 import {
     Users, Phone, Calendar, XCircle, CheckCircle2,
     FileText, Handshake, Trophy, Trash2,
@@ -310,9 +311,12 @@ async function syncCalendarEvent(leadId: number, meetingDatetime: string, meetin
         const { data: leadData } = await supabase.from('sp3chat').select('company_id').eq('id', leadId).single();
         if (!leadData?.company_id) return;
 
-        // Buscar duração padrão da empresa
-        const { data: settings } = await supabase.from('sp3_calendar_settings').select('default_meeting_duration').eq('company_id', leadData.company_id).single();
-        const duration = settings?.default_meeting_duration || 30;
+        // Duração padrão da empresa: do bundle de bootstrap se já estiver em cache
+        let duration = getCachedBootstrap(leadData.company_id)?.calendar_settings?.default_meeting_duration;
+        if (!duration) {
+            const { data: settings } = await supabase.from('sp3_calendar_settings').select('default_meeting_duration').eq('company_id', leadData.company_id).single();
+            duration = settings?.default_meeting_duration || 30;
+        }
 
         const startTime = new Date(meetingDatetime);
         const endTime = new Date(startTime.getTime() + duration * 60000);
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef, Fragment } from 'react';
 import { Settings as SettingsIcon, Shield, Smartphone, RefreshCw, CheckCircle, XCircle, Loader2, QrCode, History, Users, Trash2, Plus, Eye, EyeOff, Video, Upload, Power, PowerOff, X, MessageSquareText, Building2, Edit2, Activity, LayoutDashboard, ChevronRight, User, Calendar as CalendarIcon, Save } from 'lucide-react';
 import { supabase } from "../lib/supabase";
-import type { UserProfile, SocialProofVideo, QuickMessage, Instance, IAGap } from '../lib/supabase';
+import type { UserProfile, SocialProofVideo, QuickMessage, Instance, IAGapCluster } from '../lib/supabase';
 import PromptBuilderChat from './PromptBuilderChat';
 
 interface SettingsViewProps {
@@ -315,7 +315,7 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
     const [expandedVersionId, setExpandedVersionId] = useState<string | null>(null);
 
     // Estados de Lacunas da IA
-    const [iaGaps, setIaGaps] = useState<IAGap[]>([]);
+    const [iaGapClusters, setIaGapClusters] = useState<IAGapCluster[]>([]);
     const [iaGapCount, setIaGapCount] = useState(0);
 
     // Estados do Follow-up
@@ -662,31 +662,36 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
     };
 
     // === Funções de Lacunas da IA ===
+    // Lacunas parecidas ("qual o preço?" / "Qual o preco") são agrupadas em clusters no banco (0039)
     const fetchIaGaps = async () => {
         try {
             const { data, error } = await supabase
-                .from('sp3_ia_gaps')
-                .select('*')
+                .from('sp3_ia_gap_clusters')
+                .select('id, representative, pergunta_norm, occurrences, leads_count, status, first_seen_at, last_seen_at')
                 .eq('company_id', authUser.company_id)
-                .order('created_at', { ascending: false });
+                .eq('status', 'pending')
+                .order('occurrences', { ascending: false })
+                .order('last_seen_at', { ascending: false })
+                .limit(200);
             if (!error && data) {
-                setIaGaps(data);
-                setIaGapCount(data.filter((g: IAGap) => g.status === 'pending').length);
+                setIaGapClusters(data);
+                setIaGapCount(data.length);
             }
         } catch (err) {
             console.error('Erro ao buscar lacunas:', err);
         }
     };
 
-    const handleUpdateGapStatus = async (gapId: number, newStatus: 'resolved' | 'dismissed') => {
+    // Fechar o cluster fecha todas as lacunas pendentes dele (trigger no banco)
+    const handleUpdateGapStatus = async (clusterId: number, newStatus: 'resolved' | 'dismissed') => {
         const updateData: Record<string, string> = { status: newStatus };
         if (newStatus === 'resolved') updateData.resolved_at = new Date().toISOString();
         const { error } = await supabase
-            .from('sp3_ia_gaps')
+            .from('sp3_ia_gap_clusters')
             .update(updateData)
-            .eq('id', gapId);
+            .eq('id', clusterId);
         if (!error) {
-            setIaGaps(prev => prev.map(g => g.id === gapId ? { ...g, ...updateData } : g));
+            setIaGapClusters(prev => prev.filter(c => c.id !== clusterId));
             setIaGapCount(prev => Math.max(0, prev - 1));
         }
     };
@@ -1589,9 +1594,9 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
             });
         }
 
-        // Buscar count de lacunas da IA para badge
+        // Buscar count de lacunas da IA para badge (1 por cluster)
         supabase
-            .from('sp3_ia_gaps')
+            .from('sp3_ia_gap_clusters')
             .select('id', { count: 'exact', head: true })
             .eq('company_id', authUser.company_id)
             .eq('status', 'pending')
@@ -2096,7 +2101,7 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
                 {activeSubTab === 'ia' && (
                     <div style={{ display: 'flex', flexDirection: 'column', gap: '1rem', height: 'calc(100vh - 200px)' }}>
                         {/* Painel de Lacunas da IA */}
-                        {iaGaps.filter(g => g.status === 'pending').length > 0 && (
+                        {iaGapClusters.length > 0 && (
                             <div className="glass-card" style={{
                                 padding: '16px 20px',
                                 background: 'rgba(238, 0, 0, 0.04)',
@@ -2114,15 +2119,15 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
                                         boxShadow: '0 0 6px rgba(238,0,0,0.4)'
                                     }} />
                                     <h4 style={{ fontSize: '0.85rem', fontWeight: '800', margin: 0, color: 'var(--error, #ee0000)' }}>
-                                        Lacunas de Conhecimento ({iaGaps.filter(g => g.status === 'pending').length})
+                                        Lacunas de Conhecimento ({iaGapClusters.length})
                                     </h4>
                                     <span style={{ fontSize: '0.7rem', color: 'var(--text-muted)', marginLeft: 'auto' }}>
                                         A IA não soube responder estas perguntas
                                     </span>
                                 </div>
                                 <div style={{ flex: 1, overflowY: 'auto', display: 'flex', flexDirection: 'column', gap: '8px' }}>
-                                    {iaGaps.filter(g => g.status === 'pending').map((gap) => (
-                                        <div key={gap.id} style={{
+                                    {iaGapClusters.map((cluster) => (
+                                        <div key={cluster.id} style={{
                                             display: 'flex', alignItems: 'center', gap: '12px',
                                             padding: '10px 14px', borderRadius: '10px',
                                             background: 'var(--bg-tertiary)',
@@ -2130,16 +2135,23 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
                                         }}>
                                             <div style={{ flex: 1, minWidth: 0 }}>
                                                 <div style={{ fontSize: '0.82rem', fontWeight: '600', color: 'var(--text-primary)', marginBottom: '2px', overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }}>
-                                                    &ldquo;{gap.pergunta}&rdquo;
+                                                    &ldquo;{cluster.representative}&rdquo;
                                                 </div>
                                                 <div style={{ fontSize: '0.68rem', color: 'var(--text-muted)' }}>
-                                                    {gap.contexto_lead || 'Lead desconhecido'}
-                                                    {gap.telefone_lead ? ` · ${gap.telefone_lead}` : ''}
-                                                    {gap.created_at && ` · ${new Date(gap.created_at).toLocaleDateString('pt-BR')} ${new Date(gap.created_at).toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' })}`}
+                                                    {cluster.occurrences}x
+                                                    {` · ${cluster.leads_count} ${cluster.leads_count === 1 ? 'lead' : 'leads'}`}
+                                                    {cluster.last_seen_at && ` · última ${new Date(cluster.last_seen_at).toLocaleDateString('pt-BR')} ${new Date(cluster.last_seen_at).toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' })}`}
                                                 </div>
                                             </div>
+                                            <span style={{
+                                                padding: '2px 8px', borderRadius: '999px',
+                                                background: 'rgba(238, 0, 0, 0.1)', color: 'var(--error, #ee0000)',
+                                                fontSize: '0.7rem', fontWeight: '800', flexShrink: 0
+                                            }}>
+                                                {cluster.occurrences}
+                                            </span>
                                             <button
-                                                onClick={() => handleUpdateGapStatus(gap.id, 'resolved')}
+                                                onClick={() => handleUpdateGapStatus(cluster.id, 'resolved')}
                                                 title="Já adicionei ao prompt"
                                                 style={{
                                                     padding: '4px 10px', borderRadius: '6px', border: '1px solid rgba(16,185,129,0.3)',
@@ -2150,7 +2162,7 @@ const SettingsView = ({ authUser, readOnly = false }: SettingsViewProps) => {
                                                 Resolvida
                                             </button>
                                             <button
-                                                onClick={() => handleUpdateGapStatus(gap.id, 'dismissed')}
+                                                onClick={() => handleUpdateGapStatus(cluster.id, 'dismissed')}
                                                 title="Não relevante"
                                                 style={{
                                                     padding: '4px 10px', borderRadius: '6px', border: '1px solid var(--border-soft)',
@@ -0,0 +1,179 @@
+import { useEffect, useState } from 'react';
+import { supabase } from './supabase';
+import type { UserProfile, QuickMessage, FlowDefinition, CalendarSettings } from './supabase';
+
+// ===== Bootstrap do tenant =====
+// Um único RPC (get_tenant_bootstrap, migration 0040) traz usuário, empresa,
+// mensagens rápidas, instância, fluxos ativos e agenda. O resultado fica em
+// memória e no localStorage, e só é rebuscado quando a versão da empresa muda
+// (sp3_tenant_bootstrap_versions, via realtime). A chave da Evolution API fica
+// só na memória: a cópia do localStorage vai sem evo_api_key.
+
+export type TenantBootstrap = {
+  version: number;
+  company_id: string;
+  user: UserProfile & { company_name?: string };
+  company: {
+    id: string;
+    name: string;
+    closing_reasons: string[] | null;
+    manager_phone: string | null;
+    features: Record<string, boolean>;
+  };
+  quick_messages: QuickMessage[];
+  // evo_api_key ausente = bundle lido do localStorage, ainda não validado
+  instance: { evo_api_url: string; evo_api_key?: string; instance_name: string } | null;
+  flows: Pick<FlowDefinition, 'id' | 'name' | 'trigger_type' | 'is_active'>[];
+  calendar_settings: Pick<CalendarSettings, 'ai_can_schedule' | 'default_meeting_duration' | 'business_hours' | 'google_calendar_id'> | null;
+};
+
+const STORAGE_PREFIX = 'sp3_bootstrap_';
+
+const bundles = new Map<string, TenantBootstrap>();
+const validated = new Set<string>();
+const inflight = new Map<string, Promise<TenantBootstrap | null>>();
+const listeners = new Set<() => void>();
+
+let currentUserId: string | null = null;
+
+const storageKey = (companyId: string) => `${STORAGE_PREFIX}${currentUserId}_${companyId}`;
+const homeKey = () => `${STORAGE_PREFIX}${currentUserId}_home`;
+
+const notify = () => listeners.forEach(fn => fn());
+
+const readStored = (companyId: string): TenantBootstrap | null => {
+  try {
+    const raw = localStorage.getItem(storageKey(companyId));
+    return raw ? JSON.parse(raw) as TenantBootstrap : null;
+  } catch {
+    return null;
+  }
+};
+
+const store = (bundle: TenantBootstrap) => {
+  bundles.set(bundle.company_id, bundle);
+  validated.add(bundle.company_id);
+  try {
+    const persisted = bundle.instance
+      ? { ...bundle, instance: { ...bundle.instance, evo_api_key: undefined } }
+      : bundle;
+    localStorage.setItem(storageKey(bundle.company_id), JSON.stringify(persisted));
+    if (bundle.user?.company_id === bundle.company_id) {
+      localStorage.setItem(homeKey(), bundle.company_id);
+    }
+  } catch { }
+  notify();
+};
+
+/** Bundle em cache (memória ou localStorage), sem ir à rede. */
+export function getCachedBootstrap(companyId?: string | null): TenantBootstrap | null {
+  if (!currentUserId) return null;
+  const id = companyId || localStorage.getItem(homeKey());
+  if (!id) return null;
+  const cached = bundles.get(id) || readStored(id);
+  if (cached) bundles.set(id, cached);
+  return cached || null;
+}
+
+/**
+ * Carrega o bundle da empresa (NULL = a do usuário logado). Na primeira chamada
+ * da sessão envia a versão em cache e o servidor só devolve o bundle se ela
+ * mudou; depois disso usa a memória até o realtime avisar de nova versão.
+ */
+export async function loadTenantBootstrap(companyId?: string | null, force = false): Promise<TenantBootstrap | null> {
+  if (!currentUserId) {
+    const { data: { session } } = await supabase.auth.getSession();
+    currentUserId = session?.user.id || null;
+    if (!currentUserId) return null;
+  }
+
+  const cached = getCachedBootstrap(companyId);
+  if (cached && !force && validated.has(cached.company_id)) return cached;
+
+  const key = companyId || 'home';
+  const pending = inflight.get(key);
+  if (pending) return pending;
+
+  const request = (async () => {
+    const { data, error } = await supabase.rpc('get_tenant_bootstrap', {
+      p_company_id: companyId || null,
+      p_known_version: cached?.version ?? null,
+      // Versões de empresas diferentes podem coincidir: o servidor confere as duas
+      p_known_company_id: cached?.company_id ?? null,
+    });
+    if (error) throw error;
+    if (!data) return null;
+    if (data.unchanged && cached) {
+      const fresh = cached.instance
+        ? { ...cached, instance: { ...cached.instance, evo_api_key: data.evo_api_key ?? undefined } }
+        : cached;
+      bundles.set(fresh.company_id, fresh);
+      validated.add(fresh.company_id);
+      notify();
+      return fresh;
+    }
+    store(data as TenantBootstrap);
+    return data as TenantBootstrap;
+  })();
+
+  inflight.set(key, request);
+  try {
+    return await request;
+  } finally {
+    inflight.delete(key);
+  }
+}
+
+/** Escuta a versão da empresa e rebusca o bundle quando ela muda. */
+export function subscribeTenantBootstrap(companyId: string): () => void {
+  const channel = supabase
+    .channel(`bootstrap-${companyId}`)
+    .on('postgres_changes', {
+      event: '*',
+      schema: 'public',
+      table: 'sp3_tenant_bootstrap_versions',
+      filter: `company_id=eq.${companyId}`
+    }, (payload) => {
+      const version = (payload.new as any)?.version;
+      const cached = bundles.get(companyId);
+      if (cached && version === cached.version) return;
+      validated.delete(companyId);
+      loadTenantBootstrap(companyId, true).catch(err => console.error('Erro ao atualizar bootstrap:', err));
+    })
+    .subscribe();
+
+  return () => { supabase.removeChannel(channel); };
+}
+
+/** Limpa o cache (logout). */
+export function clearTenantBootstrap() {
+  if (currentUserId) {
+    const prefix = `${STORAGE_PREFIX}${currentUserId}_`;
+    Object.keys(localStorage).filter(k => k.startsWith(prefix)).forEach(k => localStorage.removeItem(k));
+  }
+  bundles.clear();
+  validated.clear();
+  currentUserId = null;
+  notify();
+}
+
+/** Hook: bundle da empresa, atualizado quando a versão muda. */
+export function useTenantBootstrap(companyId?: string | null): TenantBootstrap | null {
+  const [bundle, setBundle] = useState<TenantBootstrap | null>(() => getCachedBootstrap(companyId));
+
+  useEffect(() => {
+    let cancelled = false;
+    const update = () => { if (!cancelled) setBundle(getCachedBootstrap(companyId)); };
+    listeners.add(update);
+    update();
+    loadTenantBootstrap(companyId)
+      .then(update)
+      .catch(err => console.error('Erro ao carregar bootstrap:', err));
+    return () => {
+      cancelled = true;
+      listeners.delete(update);
+    };
+  }, [companyId]);
+
+  return bundle;
+}
@@ -136,6 +136,8 @@ export type InstagramAutomation = {
   post_thumbnail_url?: string;
   post_caption?: string;
   keyword: string;
+  match_mode?: 'contains' | 'whole_word';
+  dedupe_window_minutes?: number;
   active: boolean;
   reply_comment: boolean;
   reply_comment_text?: string;
@@ -319,6 +321,21 @@ export type IAGap = {
   status: 'pending' | 'resolved' | 'dismissed';
   created_at?: string;
   resolved_at?: string;
+  pergunta_norm?: string;
+  cluster_id?: number | null;
+};
+
+export type IAGapCluster = {
+  id: number;
+  company_id?: string;
+  representative: string;
+  pergunta_norm: string;
+  occurrences: number;
+  leads_count: number;
+  status: 'pending' | 'resolved' | 'dismissed';
+  first_seen_at?: string;
+  last_seen_at?: string;
+  resolved_at?: string;
 };
 
 // ===== Subscription / Billing =====
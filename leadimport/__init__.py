@@ -0,0 +1,10 @@
+"""Importação em massa de leads para sp3chat.
+
+Streams CSV/JSONL files through COPY into sp3_lead_import_staging and lets
+import_leads_batch() (migration 0041) normalize, dedupe and upsert them
+set-wise, bypassing the per-row sp3chat triggers. See leadimport/README.md.
+"""
+from .client import LeadImporter
+from .readers import iter_records, normalize_phone, to_row
+
+__all__ = ['LeadImporter', 'iter_records', 'normalize_phone', 'to_row']
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""CLI: python -m leadimport ARQUIVO --company UUID [opções]
+
+Importa um CSV ou JSONL ("-" lê do stdin) para sp3chat via COPY + upsert em
+lote. A conexão vem de --dsn ou das variáveis SUPABASE_DB_URL / DATABASE_URL.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+from .readers import iter_records, normalize_phone, to_row
+
+
+def _print_batch(stats, totals):
+    print('lote %d: %d linhas, +%d novos, %d atualizados, %d inválidos, %d fluxos  (total %d)'
+          % (totals['batches'], stats['rows'], stats['inserted'], stats['updated'],
+             stats['invalid_phone'], stats['flows_enqueued'], totals['rows']))
+
+
+def _dry_run(records):
+    """Só lê e normaliza localmente: mostra o que a importação faria com o arquivo."""
+    phones = Counter()
+    rows = invalid = 0
+    for record in records:
+        rows += 1
+        phone = normalize_phone(to_row(record)[1])
+        if phone is None:
+            invalid += 1
+        else:
+            phones[phone] += 1
+    return {
+        'rows': rows,
+        'invalid_phone': invalid,
+        'distinct_phones': len(phones),
+        'duplicates': sum(phones.values()) - len(phones),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m leadimport', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', help='arquivo .csv/.jsonl ou "-" para stdin')
+    parser.add_argument('--company', required=True, help='company_id (UUID) da empresa')
+    parser.add_argument('--dsn', default=os.environ.get('SUPABASE_DB_URL') or os.environ.get('DATABASE_URL'),
+                        help='connection string do Postgres (default: $SUPABASE_DB_URL ou $DATABASE_URL)')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='default: pela extensão do arquivo')
+    parser.add_argument('--delimiter', help='separador do CSV (default: detecta)')
+    parser.add_argument('--encoding', default='utf-8-sig')
+    parser.add_argument('--batch-size', type=int, default=50000, help='linhas por COPY/transação')
+    parser.add_argument('--no-update', action='store_true', help='não altera leads que já existem')
+    parser.add_argument('--new-lead-flows', action='store_true',
+                        help='enfileira os fluxos "Novo lead" ativos para os leads criados')
+    parser.add_argument('--flow-id', type=int, help='enfileira este fluxo para todos os leads importados')
+    parser.add_argument('--spread-minutes', type=int, default=0,
+                        help='distribui o início dos fluxos ao longo de N minutos')
+    parser.add_argument('--source', help='rótulo gravado em sp3_lead_imports (default: nome do arquivo)')
+    parser.add_argument('--dry-run', action='store_true', help='só valida o arquivo, sem conectar no banco')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado final em JSON')
+    args = parser.parse_args(argv)
+
+    records = iter_records(args.file, fmt=args.format, delimiter=args.delimiter, encoding=args.encoding)
+
+    if args.dry_run:
+        result = _dry_run(records)
+    else:
+        if not args.dsn:
+            parser.error('informe --dsn ou defina SUPABASE_DB_URL')
+        from .client import LeadImporter
+        importer = LeadImporter(
+            args.dsn, args.company,
+            batch_size=args.batch_size,
+            update_existing=not args.no_update,
+            new_lead_flows=args.new_lead_flows,
+            flow_id=args.flow_id,
+            spread_minutes=args.spread_minutes,
+        )
+        source = args.source or (os.path.basename(args.file) if args.file != '-' else 'stdin')
+        # A janela de --spread-minutes cobre o arquivo todo: conta as linhas antes
+        # (stdin não dá para reler; aí vale o ritmo do primeiro lote)
+        expected_rows = None
+        if args.spread_minutes and args.file != '-':
+            expected_rows = sum(1 for _ in iter_records(args.file, fmt=args.format, delimiter=args.delimiter,
+                                                        encoding=args.encoding))
+        result = importer.run(records, source=source, on_batch=None if args.json else _print_batch,
+                              expected_rows=expected_rows)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(' '.join('%s=%s' % kv for kv in result.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
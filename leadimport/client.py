@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Python client: COPY into staging + import_leads_batch() per batch.
+
+Needs a direct Postgres connection (Supabase: Project Settings > Database,
+connection string of the postgres role) because PostgREST does not speak
+COPY. Each batch is its own transaction: if one fails, the previous ones
+stay imported and the staging rows of the failed one are rolled back.
+"""
+import itertools
+import time
+
+try:
+    import psycopg
+except ImportError:  # pragma: no cover - depende do ambiente
+    psycopg = None
+
+from .readers import STAGING_COLUMNS, to_row
+
+COPY_SQL = 'COPY sp3_lead_import_staging (import_id, line_no, %s) FROM STDIN' % ', '.join(STAGING_COLUMNS)
+
+COUNTERS = ('rows', 'inserted', 'updated', 'unchanged', 'invalid_phone', 'duplicates', 'flows_enqueued')
+
+
+class LeadImporter:
+    """Bulk-imports leads of one company.
+
+    >>> importer = LeadImporter(dsn, company_id, new_lead_flows=True)
+    >>> importer.run(iter_records('leads.csv'), source='leads.csv')
+    {'import_id': '...', 'rows': 100000, 'inserted': 98211, ...}
+    """
+
+    def __init__(self, dsn, company_id, batch_size=50000, update_existing=True,
+                 new_lead_flows=False, flow_id=None, spread_minutes=0):
+        if psycopg is None:
+            raise RuntimeError('psycopg 3 não instalado: pip install "psycopg[binary]"')
+        if batch_size < 1:
+            raise ValueError('batch_size deve ser >= 1')
+        self.dsn = dsn
+        self.company_id = company_id
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.new_lead_flows = new_lead_flows
+        self.flow_id = flow_id
+        self.spread_minutes = spread_minutes
+
+    def run(self, records, source=None, on_batch=None, expected_rows=None):
+        """Imports an iterable of dicts. on_batch(stats, totals) after each batch.
+
+        expected_rows (total records, when known) lets spread_minutes cover
+        the whole import instead of the rate of the first batch.
+        """
+        totals = dict.fromkeys(COUNTERS, 0)
+        totals['batches'] = 0
+        started = time.monotonic()
+        rows = enumerate((to_row(r) for r in records), 1)
+
+        with psycopg.connect(self.dsn, autocommit=True) as conn:
+            import_id = conn.execute('SELECT begin_lead_import(%s, %s, %s)',
+                                     (self.company_id, source, expected_rows)).fetchone()[0]
+            totals['import_id'] = str(import_id)
+
+            while True:
+                batch = list(itertools.islice(rows, self.batch_size))
+                if not batch and totals['batches']:
+                    break
+                stats = self._import_batch(conn, import_id, batch)
+                totals['batches'] += 1
+                for k in COUNTERS:
+                    totals[k] += stats.get(k, 0)
+                if on_batch:
+                    on_batch(stats, totals)
+                if len(batch) < self.batch_size:
+                    break
+
+            # Só aqui a importação vira 'done' em sp3_lead_imports
+            conn.execute('SELECT finish_lead_import(%s)', (import_id,))
+
+        totals['elapsed_s'] = round(time.monotonic() - started, 3)
+        return totals
+
+    def _import_batch(self, conn, import_id, batch):
+        with conn.transaction():
+            with conn.cursor() as cur:
+                with cur.copy(COPY_SQL) as copy:
+                    for line_no, row in batch:
+                        copy.write_row((import_id, line_no) + row)
+                cur.execute(
+                    'SELECT import_leads_batch(%s, %s, %s, %s, %s)',
+                    (import_id, self.update_existing, self.new_lead_flows,
+                     self.flow_id, self.spread_minutes),
+                )
+                return cur.fetchone()[0]
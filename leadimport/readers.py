@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""CSV/JSONL readers and the mapping from arbitrary exports to staging rows.
+
+Known columns (in Portuguese or English, accents/case ignored) map to
+sp3chat columns; anything else ends up in custom_fields, which is what the
+Kanban shows as "campos personalizados".
+"""
+import csv
+import io
+import itertools
+import json
+import re
+import sys
+import unicodedata
+
+STAGING_COLUMNS = ('nome', 'telefone', 'stage', 'observacoes', 'instance_name', 'ia_active', 'custom_fields')
+
+FIELD_ALIASES = {
+    'nome': ('nome', 'name', 'nome completo', 'full name', 'cliente', 'contato'),
+    'telefone': ('telefone', 'phone', 'whatsapp', 'celular', 'fone', 'numero', 'mobile', 'tel'),
+    'stage': ('stage', 'etapa', 'estagio', 'fase'),
+    'observacoes': ('observacoes', 'obs', 'notes', 'notas', 'observacao'),
+    'instance_name': ('instance_name', 'instance', 'instancia'),
+    'ia_active': ('ia_active', 'ia', 'ia ativa'),
+}
+
+_TRUE = {'1', 'true', 't', 'sim', 's', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'f', 'nao', 'n', 'no', 'off'}
+
+
+def _key(name):
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[\s_\-]+', ' ', name.strip().lower())
+
+
+_ALIAS_INDEX = {_key(alias): column for column, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+
+def normalize_phone(phone):
+    """Same rule as trigger_flow_on_external_lead / sp3_normalize_phone()."""
+    digits = re.sub(r'[^0-9]', '', str(phone or ''))
+    if not digits:
+        return None
+    return '55' + digits if len(digits) <= 11 else digits
+
+
+def _parse_bool(value):
+    if value is None or isinstance(value, bool):
+        return value
+    v = _key(value)
+    if v in _TRUE:
+        return True
+    if v in _FALSE:
+        return False
+    return None
+
+
+def to_row(record):
+    """dict from the export -> tuple in STAGING_COLUMNS order.
+
+    The phone goes raw: normalization happens in the database so the rule
+    lives in a single place (sp3_normalize_phone).
+    """
+    row = dict.fromkeys(STAGING_COLUMNS)
+    custom = {}
+    for name, value in record.items():
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        column = _ALIAS_INDEX.get(_key(name))
+        if column is None:
+            custom[str(name).strip()] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        elif row[column] is None:
+            row[column] = value
+    if isinstance(record.get('custom_fields'), dict):
+        custom.pop('custom_fields', None)
+        custom.update({k: str(v) for k, v in record['custom_fields'].items()})
+    row['ia_active'] = _parse_bool(row['ia_active'])
+    for column in ('nome', 'telefone', 'stage', 'observacoes', 'instance_name'):
+        if row[column] is not None:
+            row[column] = str(row[column])
+    row['custom_fields'] = json.dumps(custom, ensure_ascii=False) if custom else None
+    return tuple(row[c] for c in STAGING_COLUMNS)
+
+
+def _open(path, encoding):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding=encoding, newline='')
+    return open(path, encoding=encoding, newline='')
+
+
+def read_csv(path, delimiter=None, encoding='utf-8-sig'):
+    with _open(path, encoding) as f:
+        lines = f
+        if delimiter is None:
+            # Sniff on the first 64 KB without seeking (stdin is not seekable)
+            sample = f.read(64 * 1024)
+            sample += f.readline()
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+            except csv.Error:
+                delimiter = ','
+            lines = itertools.chain(io.StringIO(sample), f)
+        for record in csv.DictReader(lines, delimiter=delimiter):
+            yield record
+
+
+def read_jsonl(path, encoding='utf-8-sig'):
+    with _open(path, encoding) as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError('linha %d do JSONL inválida: %s' % (n, e))
+            if not isinstance(record, dict):
+                raise ValueError('linha %d do JSONL não é um objeto' % n)
+            yield record
+
+
+def iter_records(path, fmt=None, delimiter=None, encoding='utf-8-sig'):
+    """Yields one dict per lead. fmt: 'csv' | 'jsonl' (default: by extension)."""
+    if fmt is None:
+        fmt = 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    if fmt == 'csv':
+        return read_csv(path, delimiter=delimiter, encoding=encoding)
+    if fmt == 'jsonl':
+        return read_jsonl(path, encoding=encoding)
+    raise ValueError('formato desconhecido: %r' % fmt)
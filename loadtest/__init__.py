@@ -0,0 +1,6 @@
+"""Gerador de carga end-to-end para o workflow SP3CHAT.
+
+Replays realistic Evolution API webhooks ("Gatilho") against a local
+n8n/Postgres/Redis stack while local stubs stand in for the Evolution API,
+OpenAI and ElevenLabs. See loadtest/README.md for the full procedure.
+"""
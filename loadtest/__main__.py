@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""CLI: python -m loadtest {stubs,run} [opções]
+
+  stubs  sobe apenas os stubs (Evolution/OpenAI/ElevenLabs) e fica rodando
+  run    sobe os stubs, dispara o cenário contra o webhook e imprime o relatório
+"""
+import argparse
+import json
+import sys
+import time
+
+from .metrics import RedisProbe
+from .runner import Runner, format_report
+from .scenario import Scenario
+from .stubs import ElevenLabsStub, EvolutionStub, Latency, OpenAIStub
+
+
+def _add_stub_args(p):
+    p.add_argument('--bind', default='0.0.0.0', help='endereço dos stubs (0.0.0.0 para o n8n em Docker)')
+    p.add_argument('--evolution-port', type=int, default=8081)
+    p.add_argument('--openai-port', type=int, default=8082)
+    p.add_argument('--elevenlabs-port', type=int, default=8083)
+    p.add_argument('--evolution-latency', default='50-150', help='ms, fixo ("200") ou faixa ("100-400")')
+    p.add_argument('--openai-latency', default='800-2500')
+    p.add_argument('--elevenlabs-latency', default='300-900')
+
+
+def _start_stubs(args, on_reply=None):
+    stubs = [
+        EvolutionStub(on_reply=on_reply, host=args.bind, port=args.evolution_port,
+                      latency=Latency(args.evolution_latency)),
+        OpenAIStub(host=args.bind, port=args.openai_port, latency=Latency(args.openai_latency)),
+        ElevenLabsStub(host=args.bind, port=args.elevenlabs_port, latency=Latency(args.elevenlabs_latency)),
+    ]
+    for s in stubs:
+        s.start()
+        print('%-16s %s  (%r)' % (s.name, s.url, s.httpd.latency))
+    return stubs
+
+
+def cmd_stubs(args):
+    stubs = _start_stubs(args, on_reply=lambda number, kind: print('reply %s %s' % (kind, number)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for s in stubs:
+            s.stop()
+    return 0
+
+
+def cmd_run(args):
+    scenario = Scenario(
+        tenants=args.tenants,
+        leads_per_tenant=args.leads,
+        duration=args.duration,
+        bursts_per_second=args.rate,
+        burst_size=args.burst_size,
+        burst_gap=args.burst_gap,
+        mix=args.mix,
+        instance_prefix=args.instance_prefix,
+        seed=args.seed,
+    )
+    probe = None
+    if args.redis:
+        host, _, port = args.redis.partition(':')
+        probe = RedisProbe(host, int(port or 6379), args.redis_password)
+
+    runner = Runner(scenario, args.webhook, probe=probe, concurrency=args.concurrency,
+                    drain=args.drain, sample_interval=args.sample_interval)
+    stubs = _start_stubs(args, on_reply=runner.tracker.on_reply)
+    try:
+        report = runner.run()
+    finally:
+        for s in stubs:
+            s.stop()
+    report['stub_requests'] = {s.name: s.requests for s in stubs}
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print('Relatório salvo em %s' % args.json)
+
+    # Gate de regressão para rodar antes de cada deploy do workflow_to_put
+    p95 = report['latency_from_last_msg_s'].get('p95')
+    if args.max_p95 is not None and (p95 is None or p95 > args.max_p95):
+        print('FALHOU: p95 %s > limite %.2fs' % (p95, args.max_p95), file=sys.stderr)
+        return 1
+    if args.max_unanswered is not None and report['unanswered_leads'] > args.max_unanswered:
+        print('FALHOU: %d leads sem resposta > limite %d'
+              % (report['unanswered_leads'], args.max_unanswered), file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_stubs = sub.add_parser('stubs', help='sobe apenas os stubs')
+    _add_stub_args(p_stubs)
+    p_stubs.set_defaults(func=cmd_stubs)
+
+    p_run = sub.add_parser('run', help='executa um cenário de carga')
+    _add_stub_args(p_run)
+    p_run.add_argument('--webhook', default='http://localhost:5678/webhook/sp3chat')
+    p_run.add_argument('--tenants', type=int, default=3)
+    p_run.add_argument('--leads', type=int, default=50, help='leads por tenant')
+    p_run.add_argument('--duration', type=float, default=60, help='segundos de geração de tráfego')
+    p_run.add_argument('--rate', type=float, default=2.0, help='bursts por segundo (Poisson)')
+    p_run.add_argument('--burst-size', default='1-4', help='mensagens por burst')
+    p_run.add_argument('--burst-gap', default='0.5-3', help='segundos entre mensagens do burst')
+    p_run.add_argument('--mix', default='text=70,audio=15,image=10,pdf=5')
+    p_run.add_argument('--instance-prefix', default='loadtest')
+    p_run.add_argument('--seed', type=int, default=42)
+    p_run.add_argument('--concurrency', type=int, default=32, help='requisições simultâneas ao webhook')
+    p_run.add_argument('--drain', type=float, default=180, help='segundos aguardando respostas após o envio')
+    p_run.add_argument('--redis', help='host:porta do Redis para amostrar a fila (ex: localhost:6379)')
+    p_run.add_argument('--redis-password')
+    p_run.add_argument('--sample-interval', type=float, default=1.0)
+    p_run.add_argument('--json', help='salva o relatório completo em JSON')
+    p_run.add_argument('--max-p95', type=float, help='falha (exit 1) se p95 em segundos passar deste valor')
+    p_run.add_argument('--max-unanswered', type=int, help='falha (exit 1) se mais leads ficarem sem resposta')
+    p_run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Latency tracking, percentiles and Redis queue-depth sampling."""
+import math
+import socket
+import threading
+import time
+
+
+def percentile(values, p):
+    """Nearest-rank percentile; `values` need not be sorted."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, math.ceil(p / 100.0 * len(ordered)) - 1)
+    return ordered[k]
+
+
+class ReplyTracker:
+    """Correlates webhooks sent per lead with replies seen by the Evolution stub.
+
+    Latency is measured from the last message of the burst (the buffer wait
+    is part of it) and, separately, from the first one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.sent = 0
+        self.send_errors = 0
+        self.replies = 0
+        self.unsolicited = 0
+        self.latency_last = []
+        self.latency_first = []
+        self.first_send_at = None
+        self.last_reply_at = None
+
+    def on_send(self, phone, ok=True):
+        now = time.monotonic()
+        with self._lock:
+            if not ok:
+                self.send_errors += 1
+                return
+            self.sent += 1
+            if self.first_send_at is None:
+                self.first_send_at = now
+            first, _ = self._pending.get(phone, (now, now))
+            self._pending[phone] = (first, now)
+
+    def on_reply(self, phone, kind=None):
+        now = time.monotonic()
+        with self._lock:
+            self.replies += 1
+            self.last_reply_at = now
+            pending = self._pending.pop(phone, None)
+            if pending is None:
+                # Mensagens seguintes da mesma resposta (Split Out) ou follow-ups
+                self.unsolicited += 1
+                return
+            first, last = pending
+            self.latency_last.append(now - last)
+            self.latency_first.append(now - first)
+
+    @property
+    def awaiting(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class RedisProbe:
+    """Minimal RESP client (stdlib only) used to sample queue depth.
+
+    Reports the number of lead buffers ("*_buffer" lists), the total of
+    messages held in them and, when n8n runs in queue mode, the Bull
+    wait/active lists.
+    """
+
+    BULL_KEYS = ('bull:jobs:wait', 'bull:jobs:active')
+
+    def __init__(self, host='127.0.0.1', port=6379, password=None, timeout=2.0):
+        self.addr = (host, port)
+        self.password = password
+        self.timeout = timeout
+
+    def _command(self, sock, buf, *args):
+        payload = b'*%d\r\n' % len(args)
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload += b'$%d\r\n%s\r\n' % (len(arg), arg)
+        sock.sendall(payload)
+        return self._read(sock, buf)
+
+    def _readline(self, sock, buf):
+        while b'\r\n' not in buf[0]:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError('redis fechou a conexão')
+            buf[0] += chunk
+        line, _, buf[0] = buf[0].partition(b'\r\n')
+        return line
+
+    def _read(self, sock, buf):
+        line = self._readline(sock, buf)
+        prefix, rest = line[:1], line[1:]
+        if prefix == b'+':
+            return rest.decode()
+        if prefix == b'-':
+            raise RuntimeError(rest.decode())
+        if prefix == b':':
+            return int(rest)
+        if prefix == b'$':
+            n = int(rest)
+            if n < 0:
+                return None
+            while len(buf[0]) < n + 2:
+                buf[0] += sock.recv(65536)
+            data, buf[0] = buf[0][:n], buf[0][n + 2:]
+            return data
+        if prefix == b'*':
+            n = int(rest)
+            return None if n < 0 else [self._read(sock, buf) for _ in range(n)]
+        raise RuntimeError('resposta RESP inesperada: %r' % line)
+
+    def sample(self):
+        with socket.create_connection(self.addr, timeout=self.timeout) as sock:
+            buf = [b'']
+            if self.password:
+                self._command(sock, buf, 'AUTH', self.password)
+            cursor, keys = b'0', []
+            while True:
+                cursor, batch = self._command(sock, buf, 'SCAN', cursor, 'MATCH', '*_buffer', 'COUNT', 1000)
+                keys.extend(batch)
+                if cursor in (b'0', '0'):
+                    break
+            buffered = 0
+            for key in keys:
+                if self._command(sock, buf, 'TYPE', key) == 'list':
+                    buffered += self._command(sock, buf, 'LLEN', key)
+            bull = {}
+            for key in self.BULL_KEYS:
+                bull[key.rsplit(':', 1)[1]] = self._command(sock, buf, 'LLEN', key)
+        return {'buffers': len(keys), 'buffered_messages': buffered,
+                'queue_wait': bull['wait'], 'queue_active': bull['active']}
+
+
+class QueueSampler(threading.Thread):
+    """Background thread sampling RedisProbe + in-flight leads every `interval` s."""
+
+    def __init__(self, probe, tracker, interval=1.0):
+        super().__init__(name='queue-sampler', daemon=True)
+        self.probe = probe
+        self.tracker = tracker
+        self.interval = interval
+        self.samples = []
+        self.errors = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.is_set():
+            row = {'t': time.monotonic(), 'awaiting_reply': self.tracker.awaiting}
+            if self.probe is not None:
+                try:
+                    row.update(self.probe.sample())
+                except (OSError, RuntimeError):
+                    self.errors += 1
+            self.samples.append(row)
+            self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=self.interval * 2)
+
+    def summary(self):
+        out = {}
+        for key in ('awaiting_reply', 'buffers', 'buffered_messages', 'queue_wait', 'queue_active'):
+            values = [s[key] for s in self.samples if key in s]
+            if values:
+                out[key] = {'max': max(values), 'avg': round(sum(values) / len(values), 2),
+                            'p95': percentile(values, 95)}
+        return out
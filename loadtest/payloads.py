@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Webhook payloads in the shape the "Gatilho" node receives from Evolution.
+
+Only the fields read by the workflow are filled in:
+body.data.key.remoteJid/fromMe, pushName, messageType, message.conversation,
+message.base64, imageMessage.caption and documentMessage.mimetype/caption.
+"""
+import base64
+import random
+import time
+import uuid
+
+# PNG 1x1 transparente (válido, o nó "Converso Imagem" só decodifica o base64)
+PNG_1X1 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA'
+    '60e6kgAAAABJRU5ErkJggg=='
+)
+
+TEXTS = [
+    'Oi, tudo bem?',
+    'Qual o preço da consulta?',
+    'Vocês atendem sábado?',
+    'Quero agendar um horário',
+    'Onde fica a clínica?',
+    'Aceita cartão?',
+    'Pode me mandar mais informações?',
+    'Obrigado!',
+]
+
+CAPTIONS = ['Olha isso', 'Segue o exame', 'Meu documento', '']
+
+
+def minimal_pdf(text):
+    """Return a tiny but valid single-page PDF containing `text`."""
+    stream = 'BT /F1 12 Tf 72 720 Td (%s) Tj ET' % text.replace('(', '').replace(')', '')
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+        '/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>',
+        '<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream),
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = '%PDF-1.4\n'
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += '%d 0 obj\n%s\nendobj\n' % (i, body)
+    xref = len(out)
+    out += 'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for off in offsets:
+        out += '%010d 00000 n \n' % off
+    out += 'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return out.encode('latin-1')
+
+
+def _envelope(instance, phone, push_name, message_type, message):
+    now = time.time()
+    return {
+        'event': 'messages.upsert',
+        'instance': instance,
+        'data': {
+            'key': {
+                'remoteJid': '%s@s.whatsapp.net' % phone,
+                'fromMe': False,
+                'id': uuid.uuid4().hex[:20].upper(),
+            },
+            'pushName': push_name,
+            'message': message,
+            'messageType': message_type,
+            'messageTimestamp': int(now),
+            'instanceId': instance,
+            'source': 'android',
+        },
+        'destination': 'http://localhost:5678/webhook/sp3chat',
+        'date_time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)),
+        'sender': '%s@s.whatsapp.net' % phone,
+        'server_url': 'http://localhost',
+        'apikey': 'loadtest',
+    }
+
+
+def text_message(instance, phone, push_name, rng=random):
+    return _envelope(instance, phone, push_name, 'conversation', {
+        'conversation': rng.choice(TEXTS),
+    })
+
+
+def audio_message(instance, phone, push_name, rng=random, seconds=4):
+    # Conteúdo irrelevante: o stub da OpenAI não decodifica o áudio
+    raw = bytes(rng.getrandbits(8) for _ in range(1600 * seconds))
+    return _envelope(instance, phone, push_name, 'audioMessage', {
+        'audioMessage': {'mimetype': 'audio/ogg; codecs=opus', 'seconds': seconds, 'ptt': True},
+        'base64': base64.b64encode(raw).decode(),
+    })
+
+
+def image_message(instance, phone, push_name, rng=random):
+    return _envelope(instance, phone, push_name, 'imageMessage', {
+        'imageMessage': {'mimetype': 'image/png', 'caption': rng.choice(CAPTIONS)},
+        'base64': PNG_1X1,
+    })
+
+
+def pdf_message(instance, phone, push_name, rng=random):
+    pdf = minimal_pdf(rng.choice(TEXTS))
+    return _envelope(instance, phone, push_name, 'documentMessage', {
+        'documentMessage': {
+            'mimetype': 'application/pdf',
+            'fileName': 'documento.pdf',
+            'caption': rng.choice(CAPTIONS),
+        },
+        'base64': base64.b64encode(pdf).decode(),
+    })
+
+
+BUILDERS = {
+    'text': text_message,
+    'audio': audio_message,
+    'image': image_message,
+    'pdf': pdf_message,
+}
+
+
+def build(kind, instance, phone, push_name, rng=random):
+    return BUILDERS[kind](instance, phone, push_name, rng)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Point a workflow export at the local stubs before importing it into n8n.
+
+Same approach as the fix_*.py scripts: load the JSON, patch the nodes,
+save a copy. The original file is never modified.
+
+    python -m loadtest.prepare_workflow workflow_to_put.json wf_loadtest.json \
+        --evolution http://host.docker.internal:8081 \
+        --elevenlabs http://host.docker.internal:8083 \
+        --buffer-wait 5
+
+OpenAI is not patched here: n8n takes the base URL from the OpenAI
+credential, so set "Base URL" to <openai-stub>/v1 on the loadtest instance.
+"""
+import argparse
+import json
+
+EVOLUTION_URL = 'https://evo.sp3company.shop'
+ELEVENLABS_URL = 'https://api.elevenlabs.io'
+
+
+def _replace(value, old, new):
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, list):
+        return [_replace(v, old, new) for v in value]
+    if isinstance(value, dict):
+        return {k: _replace(v, old, new) for k, v in value.items()}
+    return value
+
+
+def prepare(wf, evolution=None, elevenlabs=None, buffer_wait=None):
+    """Return (patched workflow, number of nodes changed)."""
+    changed = 0
+    for i, n in enumerate(wf['nodes']):
+        params = n.get('parameters', {})
+        patched = params
+        if evolution:
+            patched = _replace(patched, EVOLUTION_URL, evolution.rstrip('/'))
+        if elevenlabs:
+            patched = _replace(patched, ELEVENLABS_URL, elevenlabs.rstrip('/'))
+
+        if buffer_wait is not None and n['name'] == 'Parametros do Fluxo':
+            patched = json.loads(json.dumps(patched))
+            for a in patched['assignments']['assignments']:
+                if a['name'] == 'EsperaBuffer':
+                    a['value'] = buffer_wait
+
+        if patched != params:
+            wf['nodes'][i]['parameters'] = patched
+            changed += 1
+    return wf, changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    parser.add_argument('--evolution', help='URL base do stub da Evolution API')
+    parser.add_argument('--elevenlabs', help='URL base do stub da ElevenLabs')
+    parser.add_argument('--buffer-wait', type=int, help='sobrescreve EsperaBuffer (segundos)')
+    args = parser.parse_args(argv)
+
+    with open(args.src) as f:
+        wf = json.load(f)
+
+    wf, changed = prepare(wf, args.evolution, args.elevenlabs, args.buffer_wait)
+
+    with open(args.dst, 'w') as f:
+        json.dump(wf, f, ensure_ascii=False)
+
+    print('%d nós alterados -> %s' % (changed, args.dst))
+
+
+if __name__ == '__main__':
+    main()
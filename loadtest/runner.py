@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Replays a Scenario against the n8n webhook and collects the results."""
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from . import payloads
+from .metrics import QueueSampler, ReplyTracker, percentile
+
+
+def post_webhook(url, body, timeout=30.0):
+    data = json.dumps(body).encode()
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return 200 <= resp.status < 300
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _latency_stats(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+    }
+
+
+class Runner:
+    def __init__(self, scenario, webhook_url, tracker=None, probe=None,
+                 concurrency=32, drain=180.0, sample_interval=1.0, log=print):
+        self.scenario = scenario
+        self.webhook_url = webhook_url
+        self.tracker = tracker or ReplyTracker()
+        self.sampler = QueueSampler(probe, self.tracker, sample_interval)
+        self.concurrency = concurrency
+        self.drain = drain
+        self.log = log
+        self._rng = random.Random(scenario.seed + 1)
+
+    def _send(self, event):
+        body = payloads.build(event.kind, event.lead.instance, event.lead.phone, event.lead.name, self._rng)
+        ok = post_webhook(self.webhook_url, body)
+        self.tracker.on_send(event.lead.phone, ok)
+
+    def run(self):
+        events = self.scenario.events()
+        self.log('Cenário: %d eventos, %d bursts, %d leads em %d tenants, %.0fs'
+                 % (len(events), len({e.burst_id for e in events}),
+                    self.scenario.tenants * self.scenario.leads_per_tenant,
+                    self.scenario.tenants, self.scenario.duration))
+
+        self.sampler.start()
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for event in events:
+                delay = start + event.at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, event)
+        send_done = time.monotonic()
+        self.log('Envio concluído em %.1fs, aguardando respostas (até %.0fs)...' % (send_done - start, self.drain))
+
+        deadline = send_done + self.drain
+        while self.tracker.awaiting and time.monotonic() < deadline:
+            time.sleep(0.5)
+        end = time.monotonic()
+        self.sampler.stop()
+
+        return self.report(events, start, send_done, end)
+
+    def report(self, events, start, send_done, end):
+        t = self.tracker
+        mix = {}
+        for e in events:
+            mix[e.kind] = mix.get(e.kind, 0) + 1
+        answered = len(t.latency_last)
+        window = (t.last_reply_at or end) - start
+        return {
+            'events': len(events),
+            'mix': mix,
+            'sent': t.sent,
+            'send_errors': t.send_errors,
+            'replies': t.replies,
+            'answered_bursts': answered,
+            'unanswered_leads': t.awaiting,
+            'duration_s': round(end - start, 1),
+            'throughput': {
+                'sent_per_s': round(t.sent / max(send_done - start, 1e-9), 2),
+                'answered_per_s': round(answered / max(window, 1e-9), 2),
+            },
+            'latency_from_last_msg_s': _latency_stats(t.latency_last),
+            'latency_from_first_msg_s': _latency_stats(t.latency_first),
+            'queue': self.sampler.summary(),
+            'redis_sample_errors': self.sampler.errors,
+        }
+
+
+def format_report(r):
+    lines = [
+        'Mensagens enviadas: %d (%d erros)  |  respostas: %d  |  bursts respondidos: %d  |  sem resposta: %d'
+        % (r['sent'], r['send_errors'], r['replies'], r['answered_bursts'], r['unanswered_leads']),
+        'Throughput: %.2f msg/s enviadas, %.2f respostas/s'
+        % (r['throughput']['sent_per_s'], r['throughput']['answered_per_s']),
+    ]
+    for key, label in (('latency_from_last_msg_s', 'Latência (última msg)'),
+                       ('latency_from_first_msg_s', 'Latência (primeira msg)')):
+        s = r[key]
+        if s['count']:
+            lines.append('%s: p50=%.2fs p95=%.2fs p99=%.2fs max=%.2fs (n=%d)'
+                         % (label, s['p50'], s['p95'], s['p99'], s['max'], s['count']))
+        else:
+            lines.append('%s: sem amostras' % label)
+    for key, s in r['queue'].items():
+        lines.append('Fila %s: max=%s avg=%s p95=%s' % (key, s['max'], s['avg'], s['p95']))
+    return '\n'.join(lines)
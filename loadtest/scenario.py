@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Traffic model: tenants, leads, message mix and bursts.
+
+A "burst" is one lead sending several messages in a row, a few seconds
+apart — exactly what the Redis buffer ("<telefone>_buffer" + Wait) is meant
+to coalesce into a single agent call. Bursts arrive as a Poisson process.
+"""
+import random
+from dataclasses import dataclass, field
+
+
+def parse_range(spec, cast=float):
+    """"3" -> (3, 3); "1-5" -> (1, 5)."""
+    spec = str(spec).strip()
+    if '-' in spec:
+        lo, hi = spec.split('-', 1)
+        lo, hi = cast(lo), cast(hi)
+    else:
+        lo = hi = cast(spec)
+    if lo < 0 or hi < lo:
+        raise ValueError('intervalo inválido: %r' % spec)
+    return lo, hi
+
+
+def parse_mix(spec):
+    """"text=70,audio=15,image=10,pdf=5" -> {'text': 70.0, ...}."""
+    mix = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in ('text', 'audio', 'image', 'pdf'):
+            raise ValueError('tipo de mensagem desconhecido: %r' % kind)
+        mix[kind] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('mix vazio: %r' % spec)
+    return mix
+
+
+@dataclass(frozen=True)
+class Lead:
+    instance: str
+    phone: str
+    name: str
+
+
+@dataclass(order=True)
+class Event:
+    at: float
+    lead: Lead = field(compare=False)
+    kind: str = field(compare=False)
+    burst_id: int = field(compare=False)
+
+
+@dataclass
+class Scenario:
+    tenants: int = 3
+    leads_per_tenant: int = 50
+    duration: float = 60.0
+    bursts_per_second: float = 2.0
+    burst_size: str = '1-4'
+    burst_gap: str = '0.5-3'
+    mix: str = 'text=70,audio=15,image=10,pdf=5'
+    instance_prefix: str = 'loadtest'
+    seed: int = 42
+
+    def leads(self):
+        out = []
+        for t in range(self.tenants):
+            instance = '%s_%02d' % (self.instance_prefix, t)
+            for i in range(self.leads_per_tenant):
+                # 55 + DDD fictício 99 + 9 dígitos: nunca colide com número real
+                phone = '5599%d%08d' % (9 - (t % 10), t * 100000 + i)
+                out.append(Lead(instance, phone[:13], 'Lead %d-%d' % (t, i)))
+        return out
+
+    def events(self):
+        """Return the full, time-ordered list of webhook events."""
+        rng = random.Random(self.seed)
+        leads = self.leads()
+        mix = parse_mix(self.mix)
+        kinds, weights = list(mix), list(mix.values())
+        size_lo, size_hi = parse_range(self.burst_size, int)
+        gap_lo, gap_hi = parse_range(self.burst_gap)
+
+        events = []
+        t = 0.0
+        burst_id = 0
+        while True:
+            t += rng.expovariate(self.bursts_per_second)
+            if t >= self.duration:
+                break
+            lead = rng.choice(leads)
+            at = t
+            for _ in range(rng.randint(size_lo, size_hi)):
+                events.append(Event(at, lead, rng.choices(kinds, weights)[0], burst_id))
+                at += rng.uniform(gap_lo, gap_hi)
+            burst_id += 1
+        events.sort()
+        return events
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP stubs for the external APIs the SP3CHAT workflow calls.
+
+- Evolution API: /message/sendText, /message/sendWhatsAppAudio, /message/sendMedia
+  (every call is reported to the runner, which uses it as the reply timestamp)
+- OpenAI: /v1/chat/completions (streaming or not), /v1/audio/transcriptions, /v1/models
+- ElevenLabs: /v1/text-to-speech/<voice_id>
+
+Each stub sleeps for a configurable latency before answering, so the
+n8n workers see realistic upstream times.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Latency:
+    """Latency spec in milliseconds: "250" (fixed) or "100-900" (uniform)."""
+
+    def __init__(self, spec='0'):
+        spec = str(spec).strip()
+        if '-' in spec:
+            lo, hi = spec.split('-', 1)
+            self.lo, self.hi = float(lo), float(hi)
+        else:
+            self.lo = self.hi = float(spec)
+        if self.lo < 0 or self.hi < self.lo:
+            raise ValueError('latência inválida: %r' % spec)
+        self._rng = random.Random()
+
+    def sleep(self):
+        ms = self.lo if self.lo == self.hi else self._rng.uniform(self.lo, self.hi)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def __repr__(self):
+        return 'Latency(%g-%g ms)' % (self.lo, self.hi)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.latency.sleep()
+        self.server.stub.handle_get(self)
+
+    def do_POST(self):
+        raw = self._read_body()
+        self.server.latency.sleep()
+        self.server.stub.handle_post(self, raw)
+
+
+class Stub:
+    """Base class: one ThreadingHTTPServer per stub, served from a daemon thread."""
+
+    name = 'stub'
+
+    def __init__(self, host='127.0.0.1', port=0, latency='0'):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency if isinstance(latency, Latency) else Latency(latency)
+        self.httpd.stub = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def handle_get(self, req):
+        self._count()
+        req._send(404, {'error': 'not found'})
+
+    def handle_post(self, req, raw):
+        self._count()
+        req._send(404, {'error': 'not found'})
+
+
+class EvolutionStub(Stub):
+    """Evolution API: every outbound message is reported through `on_reply(number, kind)`."""
+
+    name = 'evolution-stub'
+
+    def __init__(self, on_reply=None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_reply = on_reply
+
+    def handle_post(self, req, raw):
+        self._count()
+        parts = req.path.strip('/').split('/')
+        if len(parts) < 2 or parts[0] != 'message':
+            return req._send(404, {'error': 'not found'})
+        try:
+            payload = json.loads(raw or b'{}')
+        except ValueError:
+            payload = {}
+        number = str(payload.get('number', '')).split('@')[0]
+        kind = parts[1]
+        if self.on_reply and number:
+            self.on_reply(number, kind)
+        req._send(201, {
+            'key': {
+                'remoteJid': '%s@s.whatsapp.net' % number,
+                'fromMe': True,
+                'id': uuid.uuid4().hex[:20].upper(),
+            },
+            'status': 'PENDING',
+            'messageTimestamp': int(time.time()),
+        })
+
+
+class OpenAIStub(Stub):
+    """OpenAI: canned completions compatible with the structured output parser."""
+
+    name = 'openai-stub'
+
+    REPLY = {'mensagens': ['Olá! Aqui é do atendimento.', 'Posso te ajudar com mais alguma coisa?']}
+
+    def handle_get(self, req):
+        self._count()
+        if req.path.rstrip('/').endswith('/models'):
+            return req._send(200, {'object': 'list', 'data': [
+                {'id': m, 'object': 'model', 'owned_by': 'loadtest'}
+                for m in ('gpt-4.1-mini', 'gpt-4o-mini', 'whisper-1')
+            ]})
+        req._send(404, {'error': 'not found'})
+
+    def handle_post(self, req, raw):
+        self._count()
+        path = req.path.rstrip('/')
+        if path.endswith('/audio/transcriptions'):
+            return req._send(200, {'text': 'Olá, gostaria de saber o preço da consulta.'})
+        if path.endswith('/chat/completions'):
+            try:
+                body = json.loads(raw or b'{}')
+            except ValueError:
+                body = {}
+            return self._chat(req, body)
+        req._send(404, {'error': 'not found'})
+
+    def _chat(self, req, body):
+        content = json.dumps(self.REPLY, ensure_ascii=False)
+        model = body.get('model', 'gpt-4.1-mini')
+        cid = 'chatcmpl-' + uuid.uuid4().hex
+        created = int(time.time())
+        usage = {'prompt_tokens': 200, 'completion_tokens': 30, 'total_tokens': 230}
+
+        if not body.get('stream'):
+            return req._send(200, {
+                'id': cid, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            })
+
+        chunks = [
+            {'role': 'assistant', 'content': ''},
+            {'content': content},
+        ]
+        lines = []
+        for delta in chunks:
+            lines.append('data: ' + json.dumps({
+                'id': cid, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}],
+            }))
+        lines.append('data: ' + json.dumps({
+            'id': cid, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            'usage': usage,
+        }))
+        lines.append('data: [DONE]')
+        req._send(200, ('\n\n'.join(lines) + '\n\n').encode(), 'text/event-stream')
+
+
+class ElevenLabsStub(Stub):
+    """ElevenLabs text-to-speech: returns a short fake MP3."""
+
+    name = 'elevenlabs-stub'
+
+    # Cabeçalho ID3 + frame MPEG vazio; o stub da Evolution não valida o áudio
+    AUDIO = b'ID3\x03\x00\x00\x00\x00\x00\x00' + b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+    def handle_post(self, req, raw):
+        self._count()
+        if '/text-to-speech/' not in req.path:
+            return req._send(404, {'error': 'not found'})
+        req._send(200, self.AUDIO, 'audio/mpeg')
@@ -0,0 +1,1090 @@
+-- =============================================================================
+-- Migration 0038: Métricas do Motor de Fluxos
+--
+-- Os fluxos visuais rodam no workflow n8n KWbbXXwCMorQDLqd desde a 0024, que
+-- desligou o cron do motor SQL. Nenhum dos dois motores expunha nada agregado.
+-- Esta migration adiciona:
+--
+--   1. sp3_flow_engine_ticks   → 1 linha compacta por tick (por motor)
+--   2. sp3_flow_engine_hourly  → rollup por hora (mantido indefinidamente)
+--   3. process_flow_executions() instrumentado: tempo por tipo de nó e por
+--      fase (varredura do grafo JSON, pg_net, lookups de lead/instância,
+--      avaliação de condição), contagem de claimed/completed/failed/deferred,
+--      lag da fila (NOW() - next_run_at) e detecção de overrun do cron.
+--      Só gera ticks engine='sql' se o motor SQL for religado (ou rodado à mão)
+--   4. record_flow_engine_tick()          → RPC onde o motor n8n reporta os
+--      ticks. Quem chama é o coletor python -m flowmetrics (cron de 1 minuto),
+--      que lê as execuções do workflow pela API do n8n: tempo por nó vem do
+--      runData, as contagens vêm dos ids de sp3_flow_executions que o tick
+--      pegou (ver flowmetrics/README.md)
+--   5. get_flow_engine_metrics()          → RPC (Super Admin) com snapshot + rollups
+--   6. flow_engine_metrics_prometheus()   → texto no formato Prometheus
+--      (GET /rest/v1/rpc/flow_engine_metrics_prometheus com Accept: text/plain)
+-- =============================================================================
+
+-- 1. Ticks brutos (retenção de 48h, ver rollup_flow_engine_metrics)
+CREATE TABLE IF NOT EXISTS sp3_flow_engine_ticks (
+  id              BIGSERIAL PRIMARY KEY,
+  engine          TEXT NOT NULL DEFAULT 'sql' CHECK (engine IN ('sql', 'n8n')),
+  tick_at         TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  duration_ms     NUMERIC(12,3) NOT NULL DEFAULT 0,
+  claimed         INT NOT NULL DEFAULT 0,
+  completed       INT NOT NULL DEFAULT 0,
+  failed          INT NOT NULL DEFAULT 0,
+  deferred        INT NOT NULL DEFAULT 0,
+  backlog         INT NOT NULL DEFAULT 0,      -- execuções vencidas no início do tick
+  max_lag_ms      NUMERIC(14,3) NOT NULL DEFAULT 0,
+  overrun         BOOLEAN NOT NULL DEFAULT false,
+  node_stats      JSONB NOT NULL DEFAULT '{}'::jsonb,  -- {tipo: {count, total_ms, max_ms}}
+  phase_ms        JSONB NOT NULL DEFAULT '{}'::jsonb,  -- {fase: total_ms}
+  source_id       TEXT                                 -- id da execução no n8n
+);
+
+CREATE INDEX IF NOT EXISTS idx_flow_engine_ticks_engine_at
+  ON sp3_flow_engine_ticks (engine, tick_at DESC);
+
+-- O coletor pode reenviar a mesma execução do n8n: grava uma vez só
+CREATE UNIQUE INDEX IF NOT EXISTS idx_flow_engine_ticks_source
+  ON sp3_flow_engine_ticks (engine, source_id)
+  WHERE source_id IS NOT NULL;
+
+-- 2. Rollup por hora
+CREATE TABLE IF NOT EXISTS sp3_flow_engine_hourly (
+  engine          TEXT NOT NULL,
+  hour            TIMESTAMPTZ NOT NULL,
+  ticks           INT NOT NULL DEFAULT 0,
+  overruns        INT NOT NULL DEFAULT 0,
+  claimed         INT NOT NULL DEFAULT 0,
+  completed       INT NOT NULL DEFAULT 0,
+  failed          INT NOT NULL DEFAULT 0,
+  deferred        INT NOT NULL DEFAULT 0,
+  duration_ms_sum NUMERIC(16,3) NOT NULL DEFAULT 0,
+  duration_ms_avg NUMERIC(12,3) NOT NULL DEFAULT 0,
+  duration_ms_p95 NUMERIC(12,3) NOT NULL DEFAULT 0,
+  duration_ms_max NUMERIC(12,3) NOT NULL DEFAULT 0,
+  max_backlog     INT NOT NULL DEFAULT 0,
+  max_lag_ms      NUMERIC(14,3) NOT NULL DEFAULT 0,
+  node_stats      JSONB NOT NULL DEFAULT '{}'::jsonb,
+  phase_ms        JSONB NOT NULL DEFAULT '{}'::jsonb,
+  PRIMARY KEY (engine, hour)
+);
+
+-- Somente Super Admin lê (via RPC); service role escreve
+ALTER TABLE sp3_flow_engine_ticks ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sp3_flow_engine_hourly ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Master read sp3_flow_engine_ticks" ON sp3_flow_engine_ticks;
+CREATE POLICY "Master read sp3_flow_engine_ticks" ON sp3_flow_engine_ticks
+  FOR SELECT USING (is_master_admin());
+
+DROP POLICY IF EXISTS "Master read sp3_flow_engine_hourly" ON sp3_flow_engine_hourly;
+CREATE POLICY "Master read sp3_flow_engine_hourly" ON sp3_flow_engine_hourly
+  FOR SELECT USING (is_master_admin());
+
+-- 3. Helpers
+CREATE OR REPLACE FUNCTION sp3_ms_since(p_start TIMESTAMPTZ)
+RETURNS NUMERIC AS $$
+  SELECT (EXTRACT(EPOCH FROM (clock_timestamp() - p_start)) * 1000)::numeric;
+$$ LANGUAGE sql VOLATILE;
+
+-- Acumula uma amostra em {chave: {count, total_ms, max_ms}}
+CREATE OR REPLACE FUNCTION sp3_metrics_add(p_stats JSONB, p_key TEXT, p_ms NUMERIC)
+RETURNS JSONB AS $$
+  SELECT p_stats || jsonb_build_object(
+    p_key, jsonb_build_object(
+      'count',    COALESCE((p_stats->p_key->>'count')::int, 0) + 1,
+      'total_ms', round(COALESCE((p_stats->p_key->>'total_ms')::numeric, 0) + p_ms, 3),
+      'max_ms',   round(GREATEST(COALESCE((p_stats->p_key->>'max_ms')::numeric, 0), p_ms), 3)
+    )
+  );
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 4. Motor SQL (mesma lógica da 0023, agora instrumentado). Continua sem cron:
+--    a 0024 passou a execução para o n8n. Fica medido para comparar os motores
+--    se ele for religado.
+CREATE OR REPLACE FUNCTION process_flow_executions()
+RETURNS JSONB AS $$
+DECLARE
+  v_exec RECORD;
+  v_flow_data JSONB;
+  v_current_node_id TEXT;
+  v_node JSONB;
+  v_node_type TEXT;
+  v_node_data JSONB;
+  v_next_node_id TEXT;
+  v_edge JSONB;
+  v_instance RECORD;
+  v_lead RECORD;
+  v_company RECORD;
+  v_log JSONB;
+  v_processed INT := 0;
+  v_should_stop BOOLEAN;
+  v_msg_item JSONB;
+  v_msg_text TEXT;
+  v_msg_type TEXT;
+  v_delay_value INT;
+  v_delay_unit TEXT;
+  v_condition_result BOOLEAN;
+  v_action_type TEXT;
+  v_iterations INT;
+  -- Métricas do tick
+  v_tick_start TIMESTAMPTZ := clock_timestamp();
+  v_t TIMESTAMPTZ;
+  v_node_t0 TIMESTAMPTZ;
+  v_prev_node_type TEXT;
+  v_node_stats JSONB := '{}'::jsonb;
+  v_graph_ms NUMERIC := 0;
+  v_pgnet_ms NUMERIC := 0;
+  v_history_ms NUMERIC := 0;
+  v_lead_ms NUMERIC := 0;
+  v_instance_ms NUMERIC := 0;
+  v_condition_ms NUMERIC := 0;
+  v_completed INT := 0;
+  v_failed INT := 0;
+  v_deferred INT := 0;
+  v_backlog INT := 0;
+  v_max_lag_ms NUMERIC := 0;
+  v_final_status TEXT;
+  v_duration_ms NUMERIC;
+BEGIN
+  -- Overrun: o tick anterior ainda está rodando (cron sobreposto)
+  IF NOT pg_try_advisory_xact_lock(hashtext('process_flow_executions')) THEN
+    INSERT INTO sp3_flow_engine_ticks (engine, overrun) VALUES ('sql', true);
+    RETURN jsonb_build_object('processed', 0, 'overrun', true, 'timestamp', NOW()::text);
+  END IF;
+
+  -- Tamanho e lag da fila no início do tick (usa idx_flow_exec_next_run)
+  SELECT count(*), COALESCE(max(EXTRACT(EPOCH FROM (NOW() - next_run_at)) * 1000), 0)
+  INTO v_backlog, v_max_lag_ms
+  FROM sp3_flow_executions
+  WHERE status = 'running' AND next_run_at <= NOW();
+
+  -- Buscar execuções pendentes (com lock para evitar duplicatas)
+  FOR v_exec IN
+    SELECT e.id, e.flow_id, e.lead_id, e.company_id,
+           e.current_node_id, e.execution_log, e.started_at,
+           f.flow_data
+    FROM sp3_flow_executions e
+    JOIN sp3_flows f ON f.id = e.flow_id
+    WHERE e.status = 'running'
+      AND e.next_run_at <= NOW()
+    ORDER BY e.next_run_at ASC
+    LIMIT 20
+    FOR UPDATE OF e SKIP LOCKED
+  LOOP
+    v_flow_data := v_exec.flow_data;
+    v_current_node_id := v_exec.current_node_id;
+    v_log := COALESCE(v_exec.execution_log, '[]'::jsonb);
+    v_should_stop := false;
+    v_iterations := 0;
+    v_prev_node_type := NULL;
+
+    -- Carregar dados do lead
+    v_t := clock_timestamp();
+    SELECT * INTO v_lead FROM sp3chat WHERE id = v_exec.lead_id;
+    v_lead_ms := v_lead_ms + sp3_ms_since(v_t);
+    IF v_lead IS NULL THEN
+      UPDATE sp3_flow_executions
+      SET status = 'failed', completed_at = NOW(),
+          execution_log = v_log || jsonb_build_array(
+            jsonb_build_object('node_id', v_current_node_id, 'action', 'Erro: lead não encontrado', 'timestamp', NOW()::text)
+          )
+      WHERE id = v_exec.id;
+      v_processed := v_processed + 1;
+      v_failed := v_failed + 1;
+      CONTINUE;
+    END IF;
+
+    -- Carregar instância Evolution API
+    v_t := clock_timestamp();
+    SELECT * INTO v_instance
+    FROM sp3_instances
+    WHERE company_id = v_exec.company_id AND is_active = true
+    LIMIT 1;
+
+    -- Carregar dados da empresa
+    SELECT * INTO v_company FROM sp3_companies WHERE id = v_exec.company_id;
+    v_instance_ms := v_instance_ms + sp3_ms_since(v_t);
+
+    -- Processar nós em sequência até atingir wait_delay ou end
+    WHILE NOT v_should_stop AND v_iterations < 50 LOOP
+      v_iterations := v_iterations + 1;
+
+      -- Fecha a medição do nó anterior (aqui e não no fim da iteração,
+      -- porque alguns caminhos saem com CONTINUE)
+      IF v_prev_node_type IS NOT NULL THEN
+        v_node_stats := sp3_metrics_add(v_node_stats, v_prev_node_type, sp3_ms_since(v_node_t0));
+        v_prev_node_type := NULL;
+      END IF;
+
+      -- Encontrar nó atual
+      v_t := clock_timestamp();
+      SELECT n INTO v_node
+      FROM jsonb_array_elements(v_flow_data->'nodes') AS n
+      WHERE n->>'id' = v_current_node_id
+      LIMIT 1;
+      v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+      IF v_node IS NULL THEN
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object('node_id', v_current_node_id, 'action', 'Erro: nó não encontrado no fluxo', 'timestamp', NOW()::text)
+        );
+        UPDATE sp3_flow_executions
+        SET status = 'failed', completed_at = NOW(), execution_log = v_log
+        WHERE id = v_exec.id;
+        v_should_stop := true;
+        CONTINUE;
+      END IF;
+
+      v_node_type := v_node->>'type';
+      v_node_data := v_node->'data';
+      v_prev_node_type := COALESCE(v_node_type, 'unknown');
+      v_node_t0 := clock_timestamp();
+
+      -- ==========================================
+      -- TRIGGER: apenas avança para o próximo nó
+      -- ==========================================
+      IF v_node_type = 'trigger' THEN
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object(
+            'node_id', v_current_node_id,
+            'action', 'Trigger processado',
+            'timestamp', NOW()::text,
+            'result', COALESCE(v_node_data->>'label', 'Gatilho')
+          )
+        );
+
+        -- Próximo nó
+        v_t := clock_timestamp();
+        SELECT e->>'target' INTO v_next_node_id
+        FROM jsonb_array_elements(v_flow_data->'edges') AS e
+        WHERE e->>'source' = v_current_node_id
+        LIMIT 1;
+        v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+        IF v_next_node_id IS NULL THEN
+          v_should_stop := true;
+          UPDATE sp3_flow_executions
+          SET status = 'completed', completed_at = NOW(), execution_log = v_log
+          WHERE id = v_exec.id;
+        ELSE
+          v_current_node_id := v_next_node_id;
+        END IF;
+
+      -- ==========================================
+      -- SEND_MESSAGE: envia via Evolution API
+      -- ==========================================
+      ELSIF v_node_type = 'send_message' THEN
+        IF v_instance IS NULL THEN
+          v_log := v_log || jsonb_build_array(
+            jsonb_build_object('node_id', v_current_node_id, 'action', 'Erro: instância Evolution não configurada', 'timestamp', NOW()::text)
+          );
+          UPDATE sp3_flow_executions
+          SET status = 'failed', completed_at = NOW(), execution_log = v_log
+          WHERE id = v_exec.id;
+          v_should_stop := true;
+          CONTINUE;
+        END IF;
+
+        -- Processar cada mensagem do nó
+        FOR v_msg_item IN SELECT jsonb_array_elements(COALESCE(v_node_data->'messages', '[]'::jsonb))
+        LOOP
+          v_msg_type := COALESCE(v_msg_item->>'message_type', v_msg_item->>'type', 'text');
+          v_msg_text := COALESCE(v_msg_item->>'text_content', '');
+
+          -- Substituir variáveis
+          v_msg_text := flow_replace_variables(
+            v_msg_text,
+            v_lead.nome,
+            v_lead.telefone,
+            COALESCE((regexp_match(COALESCE(v_lead.observacoes, ''), 'Email: ([^\n]+)'))[1], ''),
+            COALESCE(v_lead.observacoes, ''),
+            COALESCE(v_company.name, '')
+          );
+
+          IF v_msg_type = 'text' AND v_msg_text != '' THEN
+            -- Enviar texto via pg_net
+            v_t := clock_timestamp();
+            PERFORM net.http_post(
+              url := v_instance.evo_api_url || '/message/sendText/' || v_instance.instance_name,
+              headers := jsonb_build_object(
+                'Content-Type', 'application/json',
+                'apikey', v_instance.evo_api_key
+              ),
+              body := jsonb_build_object(
+                'number', v_lead.telefone,
+                'text', v_msg_text,
+                'delay', 500
+              )
+            );
+            v_pgnet_ms := v_pgnet_ms + sp3_ms_since(v_t);
+
+            -- Salvar no histórico de chat (para aparecer na interface)
+            v_t := clock_timestamp();
+            INSERT INTO n8n_chat_histories (company_id, session_id, message)
+            VALUES (
+              v_exec.company_id,
+              v_lead.telefone,
+              jsonb_build_object(
+                'type', 'ai',
+                'content', v_msg_text,
+                'sender', 'Flow: ' || COALESCE(v_node_data->>'label', 'Automação'),
+                'sentByCRM', true
+              )
+            );
+            v_history_ms := v_history_ms + sp3_ms_since(v_t);
+
+          ELSIF v_msg_type IN ('image', 'video') AND (v_msg_item->>'media_url') IS NOT NULL THEN
+            -- Enviar mídia via pg_net
+            v_t := clock_timestamp();
+            PERFORM net.http_post(
+              url := v_instance.evo_api_url || '/message/sendMedia/' || v_instance.instance_name,
+              headers := jsonb_build_object(
+                'Content-Type', 'application/json',
+                'apikey', v_instance.evo_api_key
+              ),
+              body := jsonb_build_object(
+                'number', v_lead.telefone,
+                'mediatype', v_msg_type,
+                'mimetype', COALESCE(v_msg_item->>'media_mime', 'image/jpeg'),
+                'caption', COALESCE(
+                  flow_replace_variables(
+                    COALESCE(v_msg_item->>'caption', ''),
+                    v_lead.nome, v_lead.telefone, '',
+                    COALESCE(v_lead.observacoes, ''),
+                    COALESCE(v_company.name, '')
+                  ), ''
+                ),
+                'media', v_msg_item->>'media_url',
+                'fileName', COALESCE(v_msg_item->>'media_name', 'media'),
+                'delay', 500
+              )
+            );
+            v_pgnet_ms := v_pgnet_ms + sp3_ms_since(v_t);
+
+            v_t := clock_timestamp();
+            INSERT INTO n8n_chat_histories (company_id, session_id, message)
+            VALUES (
+              v_exec.company_id,
+              v_lead.telefone,
+              jsonb_build_object(
+                'type', 'ai',
+                'content', COALESCE(v_msg_item->>'caption', '[Mídia enviada]'),
+                'sender', 'Flow: ' || COALESCE(v_node_data->>'label', 'Automação'),
+                'sentByCRM', true,
+                'msgStyle', v_msg_type
+              )
+            );
+            v_history_ms := v_history_ms + sp3_ms_since(v_t);
+          END IF;
+        END LOOP;
+
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object(
+            'node_id', v_current_node_id,
+            'action', 'Mensagem enviada',
+            'timestamp', NOW()::text,
+            'result', v_lead.nome || ' ← ' || LEFT(COALESCE(v_msg_text, '[mídia]'), 60)
+          )
+        );
+
+        -- Próximo nó
+        v_t := clock_timestamp();
+        SELECT e->>'target' INTO v_next_node_id
+        FROM jsonb_array_elements(v_flow_data->'edges') AS e
+        WHERE e->>'source' = v_current_node_id
+        LIMIT 1;
+        v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+        IF v_next_node_id IS NULL THEN
+          v_should_stop := true;
+          UPDATE sp3_flow_executions
+          SET status = 'completed', completed_at = NOW(),
+              current_node_id = v_current_node_id, execution_log = v_log
+          WHERE id = v_exec.id;
+        ELSE
+          v_current_node_id := v_next_node_id;
+        END IF;
+
+      -- ==========================================
+      -- WAIT_DELAY: pausa execução
+      -- ==========================================
+      ELSIF v_node_type = 'wait_delay' THEN
+        v_delay_value := COALESCE((v_node_data->>'delay_value')::int, 1);
+        v_delay_unit := COALESCE(v_node_data->>'delay_unit', 'hours');
+
+        DECLARE
+          v_target_time TIMESTAMPTZ := NULL;
+          v_is_meeting_based BOOLEAN := false;
+        BEGIN
+          IF v_delay_unit IN ('minutes_before_meeting', 'hours_before_meeting', 'days_before_meeting') THEN
+            v_is_meeting_based := true;
+            IF v_lead.meeting_datetime IS NULL THEN
+              -- Se ainda não tem data (assumindo q a pessoa esqueceu de botar no CRM momentaneamente ou tá processando)
+              -- Pausa o fluxo para checar de novo daqui a pouco
+              v_target_time := NOW() + interval '10 minutes';
+            ELSE
+              v_target_time := v_lead.meeting_datetime - 
+                CASE 
+                  WHEN v_delay_unit = 'minutes_before_meeting' THEN (v_delay_value || ' minutes')::interval
+                  WHEN v_delay_unit = 'hours_before_meeting' THEN (v_delay_value || ' hours')::interval
+                  WHEN v_delay_unit = 'days_before_meeting' THEN (v_delay_value || ' days')::interval
+                END;
+            END IF;
+          ELSE
+            v_target_time := NOW() + 
+                CASE v_delay_unit
+                  WHEN 'minutes' THEN (v_delay_value || ' minutes')::interval
+                  WHEN 'hours' THEN (v_delay_value || ' hours')::interval
+                  WHEN 'days' THEN (v_delay_value || ' days')::interval
+                  ELSE '1 hour'::interval
+                END;
+          END IF;
+
+          IF COALESCE(v_node_data->>'business_hours', 'false') = 'true' THEN
+            v_target_time := sp3_adjust_to_business_hours(v_target_time);
+          END IF;
+
+          -- Pular mensagem se já passou muito do prazo (se foi agendada pra cima da hora)
+          IF v_is_meeting_based AND v_lead.meeting_datetime IS NOT NULL AND v_target_time < NOW() - interval '10 minutes' THEN
+            v_log := v_log || jsonb_build_array(jsonb_build_object(
+              'node_id', v_current_node_id, 'action', 'Ignorado (já passou do prazo de lembrete)', 'timestamp', NOW()::text
+            ));
+            -- Pegar próximo nó (Mensagem)
+            v_t := clock_timestamp();
+            SELECT e->>'target' INTO v_next_node_id FROM jsonb_array_elements(v_flow_data->'edges') AS e WHERE e->>'source' = v_current_node_id LIMIT 1;
+            v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+            IF v_next_node_id IS NOT NULL THEN
+              -- Pular a Mensagem e ir pro próximo depois dela (o próximo Delay)
+              v_t := clock_timestamp();
+              SELECT e2->>'target' INTO v_next_node_id FROM jsonb_array_elements(v_flow_data->'edges') AS e2 WHERE e2->>'source' = v_next_node_id LIMIT 1;
+              v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+            END IF;
+
+            IF v_next_node_id IS NOT NULL THEN
+              v_current_node_id := v_next_node_id;
+              CONTINUE;
+            ELSE
+              v_should_stop := true;
+              UPDATE sp3_flow_executions SET status = 'completed', completed_at = NOW(), execution_log = v_log WHERE id = v_exec.id;
+            END IF;
+
+          ELSE
+            -- Caminho Normal da pausa
+            v_t := clock_timestamp();
+            SELECT e->>'target' INTO v_next_node_id
+            FROM jsonb_array_elements(v_flow_data->'edges') AS e
+            WHERE e->>'source' = v_current_node_id
+            LIMIT 1;
+            v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+            v_log := v_log || jsonb_build_array(
+              jsonb_build_object(
+                'node_id', v_current_node_id,
+                'action', 'Aguardando ' || v_delay_value || ' ' || REPLACE(v_delay_unit, '_meeting', ''),
+                'timestamp', NOW()::text
+              )
+            );
+
+            UPDATE sp3_flow_executions
+            SET current_node_id = COALESCE(v_next_node_id, v_current_node_id),
+                next_run_at = v_target_time,
+                execution_log = v_log
+            WHERE id = v_exec.id;
+
+            v_should_stop := true;
+          END IF;
+        END;
+
+      -- ==========================================
+      -- CONDITION: avalia e escolhe caminho
+      -- ==========================================
+      ELSIF v_node_type = 'condition' THEN
+        v_condition_result := false;
+
+        v_t := clock_timestamp();
+        CASE COALESCE(v_node_data->>'condition_type', '')
+          WHEN 'lead_responded' THEN
+            -- Verificar se lead respondeu (tem mensagem recente não enviada pelo CRM)
+            SELECT EXISTS (
+              SELECT 1 FROM n8n_chat_histories
+              WHERE session_id = v_lead.telefone
+                AND company_id = v_exec.company_id
+                AND message::jsonb->>'sentByCRM' IS DISTINCT FROM 'true'
+                AND created_at > (v_exec.started_at)::timestamptz
+            ) INTO v_condition_result;
+
+          WHEN 'stage_check' THEN
+            v_condition_result := (v_lead.stage = COALESCE(v_node_data->'config'->>'stage', ''));
+
+          WHEN 'field_check' THEN
+            CASE COALESCE(v_node_data->'config'->>'operator', 'equals')
+              WHEN 'equals' THEN
+                v_condition_result := (
+                  CASE v_node_data->'config'->>'field'
+                    WHEN 'nome' THEN v_lead.nome
+                    WHEN 'telefone' THEN v_lead.telefone
+                    WHEN 'stage' THEN v_lead.stage
+                    WHEN 'status' THEN v_lead.status
+                    ELSE ''
+                  END = COALESCE(v_node_data->'config'->>'value', '')
+                );
+              WHEN 'not_equals' THEN
+                v_condition_result := (
+                  CASE v_node_data->'config'->>'field'
+                    WHEN 'nome' THEN v_lead.nome
+                    WHEN 'telefone' THEN v_lead.telefone
+                    WHEN 'stage' THEN v_lead.stage
+                    WHEN 'status' THEN v_lead.status
+                    ELSE ''
+                  END != COALESCE(v_node_data->'config'->>'value', '')
+                );
+              WHEN 'contains' THEN
+                v_condition_result := (
+                  CASE v_node_data->'config'->>'field'
+                    WHEN 'nome' THEN v_lead.nome
+                    WHEN 'telefone' THEN v_lead.telefone
+                    WHEN 'observacoes' THEN v_lead.observacoes
+                    ELSE ''
+                  END ILIKE '%' || COALESCE(v_node_data->'config'->>'value', '') || '%'
+                );
+              WHEN 'exists' THEN
+                v_condition_result := (
+                  CASE v_node_data->'config'->>'field'
+                    WHEN 'nome' THEN v_lead.nome IS NOT NULL AND v_lead.nome != ''
+                    WHEN 'telefone' THEN v_lead.telefone IS NOT NULL AND v_lead.telefone != ''
+                    ELSE false
+                  END
+                );
+              ELSE
+                v_condition_result := false;
+            END CASE;
+
+          ELSE
+            v_condition_result := false;
+        END CASE;
+        v_condition_ms := v_condition_ms + sp3_ms_since(v_t);
+
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object(
+            'node_id', v_current_node_id,
+            'action', 'Condição avaliada',
+            'timestamp', NOW()::text,
+            'result', CASE WHEN v_condition_result THEN 'Sim (verdadeiro)' ELSE 'Não (falso)' END
+          )
+        );
+
+        -- Encontrar edge baseado no sourceHandle (true/false)
+        v_t := clock_timestamp();
+        SELECT e->>'target' INTO v_next_node_id
+        FROM jsonb_array_elements(v_flow_data->'edges') AS e
+        WHERE e->>'source' = v_current_node_id
+          AND e->>'sourceHandle' = CASE WHEN v_condition_result THEN 'true' ELSE 'false' END
+        LIMIT 1;
+        v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+        IF v_next_node_id IS NULL THEN
+          v_should_stop := true;
+          UPDATE sp3_flow_executions
+          SET status = 'completed', completed_at = NOW(),
+              current_node_id = v_current_node_id, execution_log = v_log
+          WHERE id = v_exec.id;
+        ELSE
+          v_current_node_id := v_next_node_id;
+        END IF;
+
+      -- ==========================================
+      -- ACTION: executa ação no lead
+      -- ==========================================
+      ELSIF v_node_type = 'action' THEN
+        v_action_type := COALESCE(v_node_data->>'action_type', '');
+
+        CASE v_action_type
+          WHEN 'move_stage' THEN
+            UPDATE sp3chat SET stage = COALESCE(v_node_data->'config'->>'stage', stage)
+            WHERE id = v_exec.lead_id;
+
+          WHEN 'update_field' THEN
+            CASE v_node_data->'config'->>'field'
+              WHEN 'nome' THEN UPDATE sp3chat SET nome = v_node_data->'config'->>'value' WHERE id = v_exec.lead_id;
+              WHEN 'observacoes' THEN UPDATE sp3chat SET observacoes = COALESCE(observacoes, '') || E'\n' || COALESCE(v_node_data->'config'->>'value', '') WHERE id = v_exec.lead_id;
+              ELSE NULL;
+            END CASE;
+
+          WHEN 'lock_followup' THEN
+            UPDATE sp3chat SET ia_active = false WHERE id = v_exec.lead_id;
+
+          WHEN 'unlock_followup' THEN
+            UPDATE sp3chat SET ia_active = true WHERE id = v_exec.lead_id;
+
+          WHEN 'close_conversation' THEN
+            UPDATE sp3chat SET status = 'closed' WHERE id = v_exec.lead_id;
+
+          ELSE NULL;
+        END CASE;
+
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object(
+            'node_id', v_current_node_id,
+            'action', 'Ação executada: ' || v_action_type,
+            'timestamp', NOW()::text,
+            'result', COALESCE(v_node_data->>'label', v_action_type)
+          )
+        );
+
+        -- Próximo nó
+        v_t := clock_timestamp();
+        SELECT e->>'target' INTO v_next_node_id
+        FROM jsonb_array_elements(v_flow_data->'edges') AS e
+        WHERE e->>'source' = v_current_node_id
+        LIMIT 1;
+        v_graph_ms := v_graph_ms + sp3_ms_since(v_t);
+
+        IF v_next_node_id IS NULL THEN
+          v_should_stop := true;
+          UPDATE sp3_flow_executions
+          SET status = 'completed', completed_at = NOW(),
+              current_node_id = v_current_node_id, execution_log = v_log
+          WHERE id = v_exec.id;
+        ELSE
+          v_current_node_id := v_next_node_id;
+        END IF;
+
+      -- ==========================================
+      -- END: finaliza execução
+      -- ==========================================
+      ELSIF v_node_type = 'end' THEN
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object(
+            'node_id', v_current_node_id,
+            'action', 'Fluxo finalizado',
+            'timestamp', NOW()::text,
+            'result', COALESCE(v_node_data->>'outcome', 'neutral')
+          )
+        );
+
+        UPDATE sp3_flow_executions
+        SET status = 'completed', completed_at = NOW(),
+            current_node_id = v_current_node_id, execution_log = v_log
+        WHERE id = v_exec.id;
+        v_should_stop := true;
+
+      -- ==========================================
+      -- TIPO DESCONHECIDO
+      -- ==========================================
+      ELSE
+        v_log := v_log || jsonb_build_array(
+          jsonb_build_object('node_id', v_current_node_id, 'action', 'Tipo desconhecido: ' || v_node_type, 'timestamp', NOW()::text)
+        );
+        v_should_stop := true;
+        UPDATE sp3_flow_executions
+        SET status = 'failed', completed_at = NOW(), execution_log = v_log
+        WHERE id = v_exec.id;
+      END IF;
+    END LOOP;
+
+    -- Se saiu do loop sem stop explícito (limite de iterações), salvar estado
+    IF NOT v_should_stop THEN
+      UPDATE sp3_flow_executions
+      SET current_node_id = v_current_node_id,
+          next_run_at = NOW(),
+          execution_log = v_log
+      WHERE id = v_exec.id;
+    END IF;
+
+    IF v_prev_node_type IS NOT NULL THEN
+      v_node_stats := sp3_metrics_add(v_node_stats, v_prev_node_type, sp3_ms_since(v_node_t0));
+    END IF;
+
+    SELECT status INTO v_final_status FROM sp3_flow_executions WHERE id = v_exec.id;
+    CASE v_final_status
+      WHEN 'completed' THEN v_completed := v_completed + 1;
+      WHEN 'failed' THEN v_failed := v_failed + 1;
+      ELSE v_deferred := v_deferred + 1;
+    END CASE;
+
+    v_processed := v_processed + 1;
+  END LOOP;
+
+  v_duration_ms := sp3_ms_since(v_tick_start);
+
+  -- Overrun também quando o tick passa do intervalo do cron (1 minuto)
+  INSERT INTO sp3_flow_engine_ticks (
+    engine, tick_at, duration_ms, claimed, completed, failed, deferred,
+    backlog, max_lag_ms, overrun, node_stats, phase_ms
+  ) VALUES (
+    'sql', v_tick_start, v_duration_ms, v_processed, v_completed, v_failed, v_deferred,
+    v_backlog, v_max_lag_ms, v_duration_ms > 60000, v_node_stats,
+    jsonb_build_object(
+      'graph_scan', round(v_graph_ms, 3),
+      'pg_net', round(v_pgnet_ms, 3),
+      'chat_history', round(v_history_ms, 3),
+      'lead_lookup', round(v_lead_ms, 3),
+      'instance_lookup', round(v_instance_ms, 3),
+      'condition', round(v_condition_ms, 3)
+    )
+  );
+
+  RETURN jsonb_build_object(
+    'processed', v_processed,
+    'completed', v_completed,
+    'failed', v_failed,
+    'deferred', v_deferred,
+    'backlog', v_backlog,
+    'duration_ms', round(v_duration_ms, 3),
+    'timestamp', NOW()::text
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMENT ON FUNCTION process_flow_executions() IS 'Motor SQL de fluxos visuais (sem cron desde a 0024; produção roda no n8n). Processa nós pendentes, envia mensagens WhatsApp e avança no grafo. Registra 1 linha por tick em sp3_flow_engine_ticks.';
+
+-- 5. RPC para o motor n8n reportar seus ticks no mesmo formato
+--    Body (enviado pelo flowmetrics, 1 chamada por execução do workflow):
+--      {"source_id": "48211", "tick_at": "...", "duration_ms": 812,
+--       "claimed_ids": [101, 102, 103], "max_lag_ms": 4200, "overrun": false,
+--       "node_stats": {"Enviar Mensagem": {"count": 9, "total_ms": 530, "max_ms": 120}},
+--       "phase_ms": {"http": 480, "db": 210, "code": 35}}
+--    Com claimed_ids, claimed/completed/failed/deferred saem de
+--    sp3_flow_executions: concluída/falhou até o fim do tick (completed_at)
+--    conta como completed/failed, o resto como deferred, igual ao motor SQL.
+--    backlog = pegas pelo tick + vencidas no início dele que continuam na fila.
+--    Contagens explícitas no body têm precedência.
+CREATE OR REPLACE FUNCTION record_flow_engine_tick(p_stats JSONB)
+RETURNS VOID AS $$
+DECLARE
+  v_tick_at TIMESTAMPTZ := COALESCE((p_stats->>'tick_at')::timestamptz, NOW());
+  v_duration_ms NUMERIC := COALESCE((p_stats->>'duration_ms')::numeric, 0);
+  v_tick_end TIMESTAMPTZ;
+  v_ids BIGINT[];
+  v_claimed INT := 0;
+  v_completed INT := 0;
+  v_failed INT := 0;
+  v_deferred INT := 0;
+  v_backlog INT := 0;
+BEGIN
+  v_tick_end := v_tick_at + make_interval(secs => v_duration_ms / 1000);
+
+  IF jsonb_typeof(p_stats->'claimed_ids') = 'array' THEN
+    SELECT COALESCE(array_agg(DISTINCT value::bigint), '{}')
+    INTO v_ids
+    FROM jsonb_array_elements_text(p_stats->'claimed_ids');
+
+    SELECT count(*),
+           count(*) FILTER (WHERE status = 'completed' AND completed_at <= v_tick_end),
+           count(*) FILTER (WHERE status = 'failed' AND completed_at <= v_tick_end)
+    INTO v_claimed, v_completed, v_failed
+    FROM sp3_flow_executions
+    WHERE id = ANY(v_ids);
+
+    v_deferred := v_claimed - v_completed - v_failed;
+
+    SELECT v_claimed + count(*)
+    INTO v_backlog
+    FROM sp3_flow_executions
+    WHERE status = 'running' AND next_run_at <= v_tick_at AND id <> ALL(v_ids);
+  END IF;
+
+  INSERT INTO sp3_flow_engine_ticks (
+    engine, tick_at, duration_ms, claimed, completed, failed, deferred,
+    backlog, max_lag_ms, overrun, node_stats, phase_ms, source_id
+  ) VALUES (
+    'n8n',
+    v_tick_at,
+    v_duration_ms,
+    COALESCE((p_stats->>'claimed')::int, v_claimed),
+    COALESCE((p_stats->>'completed')::int, v_completed),
+    COALESCE((p_stats->>'failed')::int, v_failed),
+    COALESCE((p_stats->>'deferred')::int, v_deferred),
+    COALESCE((p_stats->>'backlog')::int, v_backlog),
+    COALESCE((p_stats->>'max_lag_ms')::numeric, 0),
+    COALESCE((p_stats->>'overrun')::boolean, v_duration_ms > 60000),
+    COALESCE(p_stats->'node_stats', '{}'::jsonb),
+    COALESCE(p_stats->'phase_ms', '{}'::jsonb),
+    p_stats->>'source_id'
+  )
+  ON CONFLICT (engine, source_id) WHERE source_id IS NOT NULL DO NOTHING;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Somente service role (n8n) pode gravar ticks
+REVOKE EXECUTE ON FUNCTION record_flow_engine_tick(JSONB) FROM PUBLIC, anon, authenticated;
+
+-- 6. Rollup por hora + retenção dos ticks brutos
+CREATE OR REPLACE FUNCTION rollup_flow_engine_metrics()
+RETURNS JSONB AS $$
+DECLARE
+  v_hours INT;
+  v_deleted INT;
+BEGIN
+  -- Recalcula todas as horas fechadas que ainda têm ticks brutos (idempotente)
+  WITH base AS (
+    SELECT engine, date_trunc('hour', tick_at) AS hour,
+           count(*) AS ticks,
+           count(*) FILTER (WHERE overrun) AS overruns,
+           sum(claimed) AS claimed,
+           sum(completed) AS completed,
+           sum(failed) AS failed,
+           sum(deferred) AS deferred,
+           sum(duration_ms) AS duration_ms_sum,
+           avg(duration_ms) AS duration_ms_avg,
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms) AS duration_ms_p95,
+           max(duration_ms) AS duration_ms_max,
+           max(backlog) AS max_backlog,
+           max(max_lag_ms) AS max_lag_ms
+    FROM sp3_flow_engine_ticks
+    WHERE tick_at < date_trunc('hour', NOW())
+    GROUP BY 1, 2
+  ),
+  nodes AS (
+    SELECT engine, hour, jsonb_object_agg(node_type, jsonb_build_object(
+             'count', cnt, 'total_ms', round(total_ms, 3), 'max_ms', round(max_ms, 3)
+           )) AS node_stats
+    FROM (
+      SELECT t.engine, date_trunc('hour', t.tick_at) AS hour, n.key AS node_type,
+             sum((n.value->>'count')::int) AS cnt,
+             sum((n.value->>'total_ms')::numeric) AS total_ms,
+             max((n.value->>'max_ms')::numeric) AS max_ms
+      FROM sp3_flow_engine_ticks t, jsonb_each(t.node_stats) n
+      WHERE t.tick_at < date_trunc('hour', NOW())
+      GROUP BY 1, 2, 3
+    ) s
+    GROUP BY 1, 2
+  ),
+  phases AS (
+    SELECT engine, hour, jsonb_object_agg(phase, round(total_ms, 3)) AS phase_ms
+    FROM (
+      SELECT t.engine, date_trunc('hour', t.tick_at) AS hour, p.key AS phase,
+             sum(p.value::numeric) AS total_ms
+      FROM sp3_flow_engine_ticks t, jsonb_each_text(t.phase_ms) p
+      WHERE t.tick_at < date_trunc('hour', NOW())
+      GROUP BY 1, 2, 3
+    ) s
+    GROUP BY 1, 2
+  )
+  INSERT INTO sp3_flow_engine_hourly (
+    engine, hour, ticks, overruns, claimed, completed, failed, deferred,
+    duration_ms_sum, duration_ms_avg, duration_ms_p95, duration_ms_max,
+    max_backlog, max_lag_ms, node_stats, phase_ms
+  )
+  SELECT b.engine, b.hour, b.ticks, b.overruns, b.claimed, b.completed, b.failed, b.deferred,
+         b.duration_ms_sum, b.duration_ms_avg, b.duration_ms_p95, b.duration_ms_max,
+         b.max_backlog, b.max_lag_ms,
+         COALESCE(n.node_stats, '{}'::jsonb), COALESCE(p.phase_ms, '{}'::jsonb)
+  FROM base b
+  LEFT JOIN nodes n ON n.engine = b.engine AND n.hour = b.hour
+  LEFT JOIN phases p ON p.engine = b.engine AND p.hour = b.hour
+  ON CONFLICT (engine, hour) DO UPDATE SET
+    ticks = EXCLUDED.ticks,
+    overruns = EXCLUDED.overruns,
+    claimed = EXCLUDED.claimed,
+    completed = EXCLUDED.completed,
+    failed = EXCLUDED.failed,
+    deferred = EXCLUDED.deferred,
+    duration_ms_sum = EXCLUDED.duration_ms_sum,
+    duration_ms_avg = EXCLUDED.duration_ms_avg,
+    duration_ms_p95 = EXCLUDED.duration_ms_p95,
+    duration_ms_max = EXCLUDED.duration_ms_max,
+    max_backlog = EXCLUDED.max_backlog,
+    max_lag_ms = EXCLUDED.max_lag_ms,
+    node_stats = EXCLUDED.node_stats,
+    phase_ms = EXCLUDED.phase_ms;
+  GET DIAGNOSTICS v_hours = ROW_COUNT;
+
+  DELETE FROM sp3_flow_engine_ticks WHERE tick_at < date_trunc('hour', NOW()) - interval '48 hours';
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+  RETURN jsonb_build_object('hours', v_hours, 'deleted_ticks', v_deleted);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DO $$
+BEGIN
+  PERFORM cron.unschedule('rollup-flow-engine-metrics');
+EXCEPTION WHEN OTHERS THEN NULL;
+END $$;
+
+SELECT cron.schedule(
+  'rollup-flow-engine-metrics',
+  '*/15 * * * *',
+  $$SELECT rollup_flow_engine_metrics()$$
+);
+
+-- 7. RPC para o painel Super Admin
+CREATE OR REPLACE FUNCTION get_flow_engine_metrics(p_hours INT DEFAULT 24)
+RETURNS JSONB AS $$
+DECLARE
+  v_queue JSONB;
+  v_recent JSONB;
+  v_hourly JSONB;
+BEGIN
+  IF NOT is_master_admin() THEN
+    RAISE EXCEPTION 'Apenas o Super Admin pode ver as métricas do motor.';
+  END IF;
+
+  -- Fila ao vivo
+  SELECT jsonb_build_object(
+    'backlog', count(*) FILTER (WHERE next_run_at <= NOW()),
+    'scheduled', count(*) FILTER (WHERE next_run_at > NOW()),
+    'max_lag_seconds', COALESCE(round((max(EXTRACT(EPOCH FROM (NOW() - next_run_at)))
+                          FILTER (WHERE next_run_at <= NOW()))::numeric, 3), 0)
+  ) INTO v_queue
+  FROM sp3_flow_executions
+  WHERE status = 'running';
+
+  -- Últimos 30 ticks de cada motor
+  SELECT COALESCE(jsonb_agg(to_jsonb(t) - 'id' - 'rn' ORDER BY t.tick_at DESC), '[]'::jsonb) INTO v_recent
+  FROM (
+    SELECT *, row_number() OVER (PARTITION BY engine ORDER BY tick_at DESC) AS rn
+    FROM sp3_flow_engine_ticks
+    WHERE tick_at > NOW() - interval '2 hours'
+  ) t
+  WHERE t.rn <= 30;
+
+  SELECT COALESCE(jsonb_agg(to_jsonb(h) ORDER BY h.hour DESC, h.engine), '[]'::jsonb) INTO v_hourly
+  FROM sp3_flow_engine_hourly h
+  WHERE h.hour >= date_trunc('hour', NOW()) - make_interval(hours => GREATEST(p_hours, 1));
+
+  RETURN jsonb_build_object(
+    'queue', v_queue,
+    'recent_ticks', v_recent,
+    'hourly', v_hourly,
+    'timestamp', NOW()::text
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 8. Exportação no formato texto do Prometheus
+--    Contadores = rollups + ticks brutos após a última hora consolidada,
+--    então só crescem (os rollups nunca são apagados).
+CREATE OR REPLACE FUNCTION sp3_flow_engine_totals()
+RETURNS TABLE (
+  engine TEXT,
+  ticks INT,
+  overruns INT,
+  claimed INT,
+  completed INT,
+  failed INT,
+  deferred INT,
+  duration_ms_sum NUMERIC,
+  node_stats JSONB,
+  phase_ms JSONB
+) AS $$
+  WITH wm AS (
+    SELECT engine, max(hour) + interval '1 hour' AS since
+    FROM sp3_flow_engine_hourly
+    GROUP BY engine
+  )
+  SELECT h.engine, h.ticks, h.overruns, h.claimed, h.completed, h.failed, h.deferred,
+         h.duration_ms_sum, h.node_stats, h.phase_ms
+  FROM sp3_flow_engine_hourly h
+  UNION ALL
+  SELECT t.engine, 1, t.overrun::int, t.claimed, t.completed, t.failed, t.deferred,
+         t.duration_ms, t.node_stats, t.phase_ms
+  FROM sp3_flow_engine_ticks t
+  LEFT JOIN wm ON wm.engine = t.engine
+  WHERE wm.since IS NULL OR t.tick_at >= wm.since;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+REVOKE EXECUTE ON FUNCTION sp3_flow_engine_totals() FROM PUBLIC, anon, authenticated;
+
+-- STABLE: o PostgREST executa GET /rpc em transação somente leitura
+CREATE OR REPLACE FUNCTION flow_engine_metrics_prometheus()
+RETURNS TEXT AS $$
+DECLARE
+  v_out TEXT := '';
+  v_row RECORD;
+  v_backlog INT;
+  v_lag NUMERIC;
+BEGIN
+
+  v_out := v_out
+    || E'# HELP sp3_flow_engine_ticks_total Ticks executados pelo motor de fluxos.\n'
+    || E'# TYPE sp3_flow_engine_ticks_total counter\n'
+    || E'# HELP sp3_flow_engine_overruns_total Ticks sobrepostos ou acima do intervalo do cron.\n'
+    || E'# TYPE sp3_flow_engine_overruns_total counter\n'
+    || E'# HELP sp3_flow_engine_tick_duration_ms_sum Tempo total gasto em ticks.\n'
+    || E'# TYPE sp3_flow_engine_tick_duration_ms_sum counter\n'
+    || E'# HELP sp3_flow_engine_executions_total Execuções por resultado.\n'
+    || E'# TYPE sp3_flow_engine_executions_total counter\n';
+
+  FOR v_row IN
+    SELECT engine, sum(ticks) AS ticks, sum(overruns) AS overruns, sum(duration_ms_sum) AS duration_ms,
+           sum(claimed) AS claimed, sum(completed) AS completed, sum(failed) AS failed, sum(deferred) AS deferred
+    FROM sp3_flow_engine_totals()
+    GROUP BY engine
+    ORDER BY engine
+  LOOP
+    v_out := v_out
+      || format(E'sp3_flow_engine_ticks_total{engine="%s"} %s\n', v_row.engine, v_row.ticks)
+      || format(E'sp3_flow_engine_overruns_total{engine="%s"} %s\n', v_row.engine, v_row.overruns)
+      || format(E'sp3_flow_engine_tick_duration_ms_sum{engine="%s"} %s\n', v_row.engine, round(v_row.duration_ms, 3))
+      || format(E'sp3_flow_engine_executions_total{engine="%s",outcome="claimed"} %s\n', v_row.engine, v_row.claimed)
+      || format(E'sp3_flow_engine_executions_total{engine="%s",outcome="completed"} %s\n', v_row.engine, v_row.completed)
+      || format(E'sp3_flow_engine_executions_total{engine="%s",outcome="failed"} %s\n', v_row.engine, v_row.failed)
+      || format(E'sp3_flow_engine_executions_total{engine="%s",outcome="deferred"} %s\n', v_row.engine, v_row.deferred);
+  END LOOP;
+
+  v_out := v_out
+    || E'# HELP sp3_flow_engine_node_duration_ms Tempo gasto por tipo de nó.\n'
+    || E'# TYPE sp3_flow_engine_node_duration_ms summary\n';
+
+  FOR v_row IN
+    SELECT t.engine, n.key AS node_type,
+           sum((n.value->>'count')::bigint) AS cnt,
+           sum((n.value->>'total_ms')::numeric) AS total_ms
+    FROM sp3_flow_engine_totals() t, jsonb_each(t.node_stats) n
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+  LOOP
+    v_out := v_out
+      || format(E'sp3_flow_engine_node_duration_ms_sum{engine="%s",node_type="%s"} %s\n', v_row.engine, v_row.node_type, round(v_row.total_ms, 3))
+      || format(E'sp3_flow_engine_node_duration_ms_count{engine="%s",node_type="%s"} %s\n', v_row.engine, v_row.node_type, v_row.cnt);
+  END LOOP;
+
+  v_out := v_out
+    || E'# HELP sp3_flow_engine_phase_duration_ms_sum Tempo gasto por fase (grafo JSON, pg_net, lookups, condições).\n'
+    || E'# TYPE sp3_flow_engine_phase_duration_ms_sum counter\n';
+
+  FOR v_row IN
+    SELECT t.engine, p.key AS phase, sum(p.value::numeric) AS total_ms
+    FROM sp3_flow_engine_totals() t, jsonb_each_text(t.phase_ms) p
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+  LOOP
+    v_out := v_out
+      || format(E'sp3_flow_engine_phase_duration_ms_sum{engine="%s",phase="%s"} %s\n', v_row.engine, v_row.phase, round(v_row.total_ms, 3));
+  END LOOP;
+
+  -- Gauges ao vivo
+  SELECT count(*), COALESCE(max(EXTRACT(EPOCH FROM (NOW() - next_run_at)))::numeric, 0)
+  INTO v_backlog, v_lag
+  FROM sp3_flow_executions
+  WHERE status = 'running' AND next_run_at <= NOW();
+
+  v_out := v_out
+    || E'# HELP sp3_flow_engine_queue_backlog Execuções vencidas aguardando o motor.\n'
+    || E'# TYPE sp3_flow_engine_queue_backlog gauge\n'
+    || format(E'sp3_flow_engine_queue_backlog %s\n', v_backlog)
+    || E'# HELP sp3_flow_engine_queue_lag_seconds Maior NOW() - next_run_at entre as execuções vencidas.\n'
+    || E'# TYPE sp3_flow_engine_queue_lag_seconds gauge\n'
+    || format(E'sp3_flow_engine_queue_lag_seconds %s\n', round(v_lag, 3))
+    || E'# HELP sp3_flow_engine_last_tick_timestamp_seconds Horário do último tick.\n'
+    || E'# TYPE sp3_flow_engine_last_tick_timestamp_seconds gauge\n';
+
+  FOR v_row IN
+    SELECT engine, EXTRACT(EPOCH FROM max(tick_at))::numeric AS ts
+    FROM sp3_flow_engine_ticks
+    GROUP BY engine
+    ORDER BY engine
+  LOOP
+    v_out := v_out
+      || format(E'sp3_flow_engine_last_tick_timestamp_seconds{engine="%s"} %s\n', v_row.engine, round(v_row.ts, 3));
+  END LOOP;
+
+  RETURN v_out;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+-- Scraper usa a service key; Super Admin usa get_flow_engine_metrics()
+REVOKE EXECUTE ON FUNCTION flow_engine_metrics_prometheus() FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,314 @@
+-- =============================================================================
+-- Migration 0039: Agrupamento de Lacunas da IA por similaridade
+--
+-- A 0035 só deduplica texto idêntico, então "qual o preço?" e "Qual o preco"
+-- viram lacunas separadas e o operador revisa a mesma pergunta centenas de
+-- vezes. Agora:
+--
+--   1. pergunta_norm: minúsculas, sem acento, sem pontuação (pergunta só com
+--      emoji ou em outro alfabeto fica com o texto cru em minúsculas)
+--   2. assinatura MinHash (32 hashes) dos trigramas de caracteres
+--   3. índice LSH (16 bandas x 2 linhas) em sp3_ia_gap_lsh: cada INSERT
+--      busca candidatos só nos buckets das suas bandas (lookup por índice,
+--      não varre os clusters da empresa) e se anexa ao cluster mais parecido
+--      (Jaccard estimado >= 0.5) ou cria um novo
+--   4. sp3_ia_gap_clusters guarda a pergunta representativa, ocorrências e
+--      leads distintos — é o que a tela de Configuração da IA lista
+--
+-- Tudo calculado no próprio Postgres, sem serviço externo. Sinônimos
+-- ("quanto custa?" x "qual o preço?") não são agrupados: a similaridade é
+-- lexical.
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- 1. Normalização. Se não sobra nada (só emoji, outro alfabeto) usa o texto
+-- cru para a lacuna ainda ganhar cluster e aparecer na tela
+CREATE OR REPLACE FUNCTION sp3_normalize_gap(p_text TEXT)
+RETURNS TEXT AS $$
+  SELECT COALESCE(
+    NULLIF(btrim(regexp_replace(
+      regexp_replace(lower(unaccent(COALESCE(p_text, ''))), '[^a-z0-9]+', ' ', 'g'),
+      '\s+', ' ', 'g'
+    )), ''),
+    btrim(regexp_replace(lower(COALESCE(p_text, '')), '\s+', ' ', 'g'))
+  );
+$$ LANGUAGE sql STABLE;
+
+-- 2. Assinatura MinHash: para cada semente i, o menor hash entre os trigramas
+CREATE OR REPLACE FUNCTION sp3_gap_minhash(p_norm TEXT)
+RETURNS INT[] AS $$
+  WITH padded AS (
+    SELECT ' ' || p_norm || ' ' AS s
+  ),
+  shingles AS (
+    SELECT DISTINCT substr(s, pos, 3) AS sh
+    FROM padded, generate_series(1, GREATEST(length(s) - 2, 1)) AS pos
+  )
+  SELECT array_agg(m ORDER BY i)
+  FROM (
+    SELECT i, min(hashtext(i::text || ':' || sh)) AS m
+    FROM generate_series(1, 32) AS i, shingles
+    GROUP BY i
+  ) h;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Buckets LSH: 16 bandas de 2 hashes cada
+CREATE OR REPLACE FUNCTION sp3_gap_lsh_buckets(p_sig INT[])
+RETURNS TABLE (band SMALLINT, bucket INT) AS $$
+  SELECT b::smallint, hashtext(array_to_string(p_sig[(b - 1) * 2 + 1 : b * 2], ','))
+  FROM generate_series(1, 16) AS b;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Jaccard estimado = fração de posições iguais nas assinaturas
+CREATE OR REPLACE FUNCTION sp3_gap_similarity(p_a INT[], p_b INT[])
+RETURNS NUMERIC AS $$
+  SELECT count(*) FILTER (WHERE p_a[i] = p_b[i])::numeric / 32
+  FROM generate_series(1, 32) AS i;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 3. Clusters
+CREATE TABLE IF NOT EXISTS sp3_ia_gap_clusters (
+  id             BIGSERIAL PRIMARY KEY,
+  company_id     UUID NOT NULL REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  representative TEXT NOT NULL,
+  pergunta_norm  TEXT NOT NULL,
+  signature      INT[] NOT NULL,
+  occurrences    INT NOT NULL DEFAULT 0,
+  leads_count    INT NOT NULL DEFAULT 0,
+  status         TEXT NOT NULL DEFAULT 'pending'
+                 CHECK (status IN ('pending', 'resolved', 'dismissed')),
+  first_seen_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  last_seen_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  resolved_at    TIMESTAMPTZ
+);
+
+ALTER TABLE sp3_ia_gap_clusters ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Isolate sp3_ia_gap_clusters" ON sp3_ia_gap_clusters;
+CREATE POLICY "Isolate sp3_ia_gap_clusters" ON sp3_ia_gap_clusters
+  FOR ALL USING (company_id = get_my_company_id() OR is_master_admin());
+
+CREATE INDEX IF NOT EXISTS idx_ia_gap_clusters_pending
+  ON sp3_ia_gap_clusters (company_id, occurrences DESC)
+  WHERE status = 'pending';
+
+-- Índice LSH (só clusters pendentes; linhas saem quando o cluster é fechado)
+CREATE TABLE IF NOT EXISTS sp3_ia_gap_lsh (
+  company_id UUID NOT NULL REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  band       SMALLINT NOT NULL,
+  bucket     INT NOT NULL,
+  cluster_id BIGINT NOT NULL REFERENCES sp3_ia_gap_clusters(id) ON DELETE CASCADE,
+  PRIMARY KEY (company_id, band, bucket, cluster_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ia_gap_lsh_cluster ON sp3_ia_gap_lsh (cluster_id);
+
+-- Acesso apenas pelas funções SECURITY DEFINER abaixo
+ALTER TABLE sp3_ia_gap_lsh ENABLE ROW LEVEL SECURITY;
+
+-- 4. Colunas novas em sp3_ia_gaps
+ALTER TABLE sp3_ia_gaps ADD COLUMN IF NOT EXISTS pergunta_norm TEXT;
+ALTER TABLE sp3_ia_gaps ADD COLUMN IF NOT EXISTS cluster_id BIGINT
+  REFERENCES sp3_ia_gap_clusters(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_ia_gaps_cluster
+  ON sp3_ia_gaps (cluster_id, telefone_lead);
+
+-- 5. Atribuição de cluster (BEFORE INSERT). Os contadores ficam no AFTER
+-- INSERT: com ON CONFLICT DO NOTHING (webhook duplicado, ver 0035) o BEFORE
+-- roda mas a linha não entra, e o AFTER não dispara.
+CREATE OR REPLACE FUNCTION trg_assign_ia_gap_cluster()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_sig INT[];
+  v_cluster_id BIGINT;
+BEGIN
+  NEW.pergunta_norm := sp3_normalize_gap(NEW.pergunta);
+
+  -- Serializa inserts da mesma empresa para não criar clusters gêmeos
+  PERFORM pg_advisory_xact_lock(hashtext('sp3_ia_gaps:' || NEW.company_id::text));
+
+  -- Duplicata pendente (vai cair no ON CONFLICT): mesmo cluster, sem criar outro
+  SELECT cluster_id INTO v_cluster_id
+  FROM sp3_ia_gaps
+  WHERE company_id = NEW.company_id AND pergunta_norm = NEW.pergunta_norm
+    AND telefone_lead = NEW.telefone_lead AND status = 'pending'
+    AND cluster_id IS NOT NULL
+  LIMIT 1;
+
+  IF v_cluster_id IS NOT NULL THEN
+    NEW.cluster_id := v_cluster_id;
+    RETURN NEW;
+  END IF;
+
+  v_sig := sp3_gap_minhash(NEW.pergunta_norm);
+
+  -- Candidatos: clusters pendentes que compartilham pelo menos 1 bucket
+  SELECT c.id INTO v_cluster_id
+  FROM sp3_gap_lsh_buckets(v_sig) b
+  JOIN sp3_ia_gap_lsh l
+    ON l.company_id = NEW.company_id AND l.band = b.band AND l.bucket = b.bucket
+  JOIN sp3_ia_gap_clusters c ON c.id = l.cluster_id
+  WHERE c.status = 'pending'
+  GROUP BY c.id, c.signature, c.occurrences
+  HAVING sp3_gap_similarity(v_sig, c.signature) >= 0.5
+  ORDER BY sp3_gap_similarity(v_sig, c.signature) DESC, c.occurrences DESC
+  LIMIT 1;
+
+  IF v_cluster_id IS NULL THEN
+    INSERT INTO sp3_ia_gap_clusters (
+      company_id, representative, pergunta_norm, signature, first_seen_at, last_seen_at
+    ) VALUES (
+      NEW.company_id, NEW.pergunta, NEW.pergunta_norm, v_sig,
+      COALESCE(NEW.created_at, NOW()), COALESCE(NEW.created_at, NOW())
+    )
+    RETURNING id INTO v_cluster_id;
+
+    INSERT INTO sp3_ia_gap_lsh (company_id, band, bucket, cluster_id)
+    SELECT NEW.company_id, b.band, b.bucket, v_cluster_id
+    FROM sp3_gap_lsh_buckets(v_sig) b
+    ON CONFLICT DO NOTHING;
+  END IF;
+
+  NEW.cluster_id := v_cluster_id;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Contadores do cluster (AFTER INSERT: só linhas que realmente entraram)
+CREATE OR REPLACE FUNCTION trg_count_ia_gap_cluster()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_new_lead BOOLEAN;
+BEGIN
+  IF NEW.cluster_id IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  v_new_lead := NEW.telefone_lead IS NOT NULL AND NOT EXISTS (
+    SELECT 1 FROM sp3_ia_gaps
+    WHERE cluster_id = NEW.cluster_id AND telefone_lead = NEW.telefone_lead
+      AND id <> NEW.id
+  );
+
+  UPDATE sp3_ia_gap_clusters
+  SET occurrences = occurrences + 1,
+      leads_count = leads_count + CASE WHEN v_new_lead THEN 1 ELSE 0 END,
+      last_seen_at = GREATEST(last_seen_at, NEW.created_at)
+  WHERE id = NEW.cluster_id;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 6. Fechar um cluster fecha as lacunas pendentes dele e o tira do índice LSH
+CREATE OR REPLACE FUNCTION trg_sync_ia_gap_cluster_status()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.status != 'pending' THEN
+    UPDATE sp3_ia_gaps
+    SET status = NEW.status,
+        resolved_at = CASE WHEN NEW.status = 'resolved' THEN COALESCE(NEW.resolved_at, NOW()) ELSE resolved_at END
+    WHERE cluster_id = NEW.id AND status = 'pending';
+
+    DELETE FROM sp3_ia_gap_lsh WHERE cluster_id = NEW.id;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 7. Backfill: normalizar, remover duplicatas normalizadas e agrupar o histórico
+UPDATE sp3_ia_gaps SET pergunta_norm = sp3_normalize_gap(pergunta) WHERE pergunta_norm IS NULL;
+
+DELETE FROM sp3_ia_gaps a
+USING sp3_ia_gaps b
+WHERE a.id > b.id
+  AND a.status = 'pending' AND b.status = 'pending'
+  AND a.company_id = b.company_id
+  AND a.pergunta_norm = b.pergunta_norm
+  AND a.telefone_lead IS NOT DISTINCT FROM b.telefone_lead;
+
+-- Dedup agora pelo texto normalizado ("Qual o preço?" = "qual o preco")
+DROP INDEX IF EXISTS idx_ia_gaps_dedup;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ia_gaps_dedup
+  ON sp3_ia_gaps (company_id, pergunta_norm, telefone_lead)
+  WHERE status = 'pending';
+
+DO $$
+DECLARE
+  v_gap RECORD;
+  v_sig INT[];
+  v_cluster_id BIGINT;
+BEGIN
+  FOR v_gap IN
+    SELECT id, company_id, pergunta, pergunta_norm, telefone_lead, created_at
+    FROM sp3_ia_gaps
+    WHERE status = 'pending' AND cluster_id IS NULL
+    ORDER BY id
+  LOOP
+    v_sig := sp3_gap_minhash(v_gap.pergunta_norm);
+    v_cluster_id := NULL;
+
+    SELECT c.id INTO v_cluster_id
+    FROM sp3_gap_lsh_buckets(v_sig) b
+    JOIN sp3_ia_gap_lsh l
+      ON l.company_id = v_gap.company_id AND l.band = b.band AND l.bucket = b.bucket
+    JOIN sp3_ia_gap_clusters c ON c.id = l.cluster_id
+    GROUP BY c.id, c.signature, c.occurrences
+    HAVING sp3_gap_similarity(v_sig, c.signature) >= 0.5
+    ORDER BY sp3_gap_similarity(v_sig, c.signature) DESC, c.occurrences DESC
+    LIMIT 1;
+
+    IF v_cluster_id IS NULL THEN
+      INSERT INTO sp3_ia_gap_clusters (
+        company_id, representative, pergunta_norm, signature, first_seen_at, last_seen_at
+      ) VALUES (
+        v_gap.company_id, v_gap.pergunta, v_gap.pergunta_norm, v_sig, v_gap.created_at, v_gap.created_at
+      )
+      RETURNING id INTO v_cluster_id;
+
+      INSERT INTO sp3_ia_gap_lsh (company_id, band, bucket, cluster_id)
+      SELECT v_gap.company_id, b.band, b.bucket, v_cluster_id
+      FROM sp3_gap_lsh_buckets(v_sig) b
+      ON CONFLICT DO NOTHING;
+    END IF;
+
+    UPDATE sp3_ia_gaps SET cluster_id = v_cluster_id WHERE id = v_gap.id;
+  END LOOP;
+
+  UPDATE sp3_ia_gap_clusters c
+  SET occurrences = s.occurrences,
+      leads_count = s.leads_count,
+      last_seen_at = s.last_seen_at
+  FROM (
+    SELECT cluster_id, count(*) AS occurrences,
+           count(DISTINCT telefone_lead) AS leads_count,
+           max(created_at) AS last_seen_at
+    FROM sp3_ia_gaps
+    WHERE cluster_id IS NOT NULL
+    GROUP BY cluster_id
+  ) s
+  WHERE s.cluster_id = c.id;
+END;
+$$;
+
+-- 8. Triggers (criados depois do backfill para não reprocessar o histórico)
+DROP TRIGGER IF EXISTS trg_ia_gap_cluster ON sp3_ia_gaps;
+CREATE TRIGGER trg_ia_gap_cluster
+  BEFORE INSERT ON sp3_ia_gaps
+  FOR EACH ROW
+  EXECUTE FUNCTION trg_assign_ia_gap_cluster();
+
+DROP TRIGGER IF EXISTS trg_ia_gap_cluster_count ON sp3_ia_gaps;
+CREATE TRIGGER trg_ia_gap_cluster_count
+  AFTER INSERT ON sp3_ia_gaps
+  FOR EACH ROW
+  EXECUTE FUNCTION trg_count_ia_gap_cluster();
+
+DROP TRIGGER IF EXISTS trg_ia_gap_cluster_status ON sp3_ia_gap_clusters;
+CREATE TRIGGER trg_ia_gap_cluster_status
+  AFTER UPDATE OF status ON sp3_ia_gap_clusters
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION trg_sync_ia_gap_cluster_status();
@@ -0,0 +1,259 @@
+-- =============================================================================
+-- Migration 0040: Bundle de bootstrap do tenant (uma chamada por carregamento)
+--
+-- Ao abrir o CRM o front fazia uma cascata de consultas: sp3_users +
+-- sp3_companies no App, depois closing_reasons, sp3_quick_messages,
+-- sp3_instances e sp3_flows no ChatView, sp3_calendar_settings no Kanban...
+-- 6 a 10 round trips antes da tela ficar utilizável, o que pesa no 4G.
+--
+--   1. sp3_tenant_bootstrap_versions: um contador por empresa, incrementado
+--      por trigger sempre que algo que compõe o bundle muda
+--   2. get_tenant_bootstrap(): devolve tudo num único JSONB com o número da
+--      versão; se o cliente já tem a versão atual, devolve só a versão
+--   3. A tabela de versões entra no supabase_realtime: o front guarda o
+--      bundle em cache (localStorage) e só rebusca quando a versão muda
+-- =============================================================================
+
+-- 1. Versão por empresa
+CREATE TABLE IF NOT EXISTS sp3_tenant_bootstrap_versions (
+  company_id UUID PRIMARY KEY REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE sp3_tenant_bootstrap_versions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Isolate sp3_tenant_bootstrap_versions" ON sp3_tenant_bootstrap_versions;
+CREATE POLICY "Isolate sp3_tenant_bootstrap_versions" ON sp3_tenant_bootstrap_versions
+  FOR SELECT USING (company_id = get_my_company_id() OR is_master_admin());
+
+INSERT INTO sp3_tenant_bootstrap_versions (company_id)
+SELECT id FROM sp3_companies
+ON CONFLICT (company_id) DO NOTHING;
+
+-- 2. Trigger que incrementa a versão
+CREATE OR REPLACE FUNCTION sp3_bump_tenant_bootstrap()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_company_id UUID;
+BEGIN
+  IF TG_TABLE_NAME = 'sp3_companies' THEN
+    v_company_id := COALESCE(NEW.id, OLD.id);
+  ELSIF TG_OP = 'DELETE' THEN
+    v_company_id := OLD.company_id;
+  ELSE
+    v_company_id := NEW.company_id;
+  END IF;
+
+  -- Empresa sendo excluída: a linha de versão cai junto pelo CASCADE
+  IF v_company_id IS NULL OR (TG_TABLE_NAME = 'sp3_companies' AND TG_OP = 'DELETE') THEN
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO sp3_tenant_bootstrap_versions (company_id, version, updated_at)
+  VALUES (v_company_id, 1, NOW())
+  ON CONFLICT (company_id) DO UPDATE
+    SET version = sp3_tenant_bootstrap_versions.version + 1,
+        updated_at = NOW();
+
+  -- Usuário trocou de empresa: a antiga também precisa invalidar
+  IF TG_TABLE_NAME = 'sp3_users' AND TG_OP = 'UPDATE'
+     AND OLD.company_id IS DISTINCT FROM NEW.company_id AND OLD.company_id IS NOT NULL THEN
+    UPDATE sp3_tenant_bootstrap_versions
+    SET version = version + 1, updated_at = NOW()
+    WHERE company_id = OLD.company_id;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Só as colunas que o bundle devolve invalidam o cache: status da instância,
+-- tokens/sync_token do Google, flow_data etc. não fazem a empresa rebuscar.
+-- NULL = todas (sp3_quick_messages vai inteira no bundle). sp3_calendar_settings
+-- e sp3_quick_messages não foram criadas por migration neste repositório, e
+-- closing_reasons/manager_phone podem não existir: daí o to_regclass e o filtro
+-- em information_schema.
+DO $$
+DECLARE
+  r RECORD;
+  v_cols TEXT[];
+BEGIN
+  FOR r IN
+    SELECT * FROM (VALUES
+      ('sp3_companies',         ARRAY['name', 'closing_reasons', 'manager_phone', 'features']),
+      ('sp3_users',             ARRAY['company_id', 'email', 'nome', 'role', 'permissions']),
+      ('sp3_quick_messages',    NULL::TEXT[]),
+      ('sp3_instances',         ARRAY['company_id', 'is_active', 'evo_api_url', 'evo_api_key', 'instance_name']),
+      ('sp3_flows',             ARRAY['company_id', 'is_active', 'name', 'trigger_type']),
+      ('sp3_calendar_settings', ARRAY['company_id', 'ai_can_schedule', 'default_meeting_duration',
+                                      'business_hours', 'google_calendar_id'])
+    ) AS t(tbl, cols)
+  LOOP
+    CONTINUE WHEN to_regclass('public.' || r.tbl) IS NULL;
+
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_bump_tenant_bootstrap ON %I', r.tbl);
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_bump_tenant_bootstrap_upd ON %I', r.tbl);
+    EXECUTE format(
+      'CREATE TRIGGER trg_bump_tenant_bootstrap
+         AFTER INSERT OR DELETE ON %I
+         FOR EACH ROW EXECUTE FUNCTION sp3_bump_tenant_bootstrap()', r.tbl);
+
+    IF r.cols IS NULL THEN
+      -- UPDATE sem mudança real (ex.: regravar a mesma linha) não invalida o cache
+      EXECUTE format(
+        'CREATE TRIGGER trg_bump_tenant_bootstrap_upd
+           AFTER UPDATE ON %I
+           FOR EACH ROW
+           WHEN (OLD.* IS DISTINCT FROM NEW.*)
+           EXECUTE FUNCTION sp3_bump_tenant_bootstrap()', r.tbl);
+      CONTINUE;
+    END IF;
+
+    SELECT array_agg(c ORDER BY ord) INTO v_cols
+    FROM unnest(r.cols) WITH ORDINALITY AS u(c, ord)
+    WHERE EXISTS (
+      SELECT 1 FROM information_schema.columns
+      WHERE table_schema = 'public' AND table_name = r.tbl AND column_name = u.c
+    );
+    CONTINUE WHEN v_cols IS NULL;
+
+    -- ROW(...) para funcionar também com uma coluna só
+    EXECUTE format(
+      'CREATE TRIGGER trg_bump_tenant_bootstrap_upd
+         AFTER UPDATE OF %s ON %I
+         FOR EACH ROW
+         WHEN (ROW(%s) IS DISTINCT FROM ROW(%s))
+         EXECUTE FUNCTION sp3_bump_tenant_bootstrap()',
+      (SELECT string_agg(quote_ident(c), ', ') FROM unnest(v_cols) c),
+      r.tbl,
+      (SELECT string_agg('OLD.' || quote_ident(c), ', ') FROM unnest(v_cols) c),
+      (SELECT string_agg('NEW.' || quote_ident(c), ', ') FROM unnest(v_cols) c));
+  END LOOP;
+END $$;
+
+-- 3. Realtime: o front escuta UPDATE nesta tabela
+DO $$
+BEGIN
+  ALTER PUBLICATION supabase_realtime ADD TABLE sp3_tenant_bootstrap_versions;
+EXCEPTION WHEN OTHERS THEN NULL;
+END $$;
+
+-- 4. RPC do bundle
+-- p_company_id: empresa a carregar (NULL = a do usuário; outra só para master
+-- admin impersonando). p_known_company_id / p_known_version: empresa e versão
+-- do bundle que o cliente tem em cache. Os contadores de todas as empresas
+-- começam em 1, então a versão sozinha não basta: um usuário movido de
+-- empresa receberia 'unchanged' e ficaria com o bundle da antiga.
+DROP FUNCTION IF EXISTS get_tenant_bootstrap(UUID, BIGINT);
+CREATE OR REPLACE FUNCTION get_tenant_bootstrap(
+  p_company_id UUID DEFAULT NULL,
+  p_known_version BIGINT DEFAULT NULL,
+  p_known_company_id UUID DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_user RECORD;
+  v_company RECORD;
+  v_company_id UUID;
+  v_version BIGINT;
+BEGIN
+  SELECT u.*, c.name AS company_name INTO v_user
+  FROM sp3_users u
+  LEFT JOIN sp3_companies c ON c.id = u.company_id
+  WHERE u.id = auth.uid();
+
+  -- Usuário sem cadastro em sp3_users: o front trata como acesso negado
+  IF v_user.id IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  v_company_id := COALESCE(p_company_id, v_user.company_id);
+
+  IF v_company_id IS DISTINCT FROM v_user.company_id AND NOT is_master_admin() THEN
+    RAISE EXCEPTION 'Acesso negado: empresa não pertence ao usuário';
+  END IF;
+
+  SELECT * INTO v_company FROM sp3_companies WHERE id = v_company_id;
+  IF v_company.id IS NULL THEN
+    RAISE EXCEPTION 'Empresa não encontrada';
+  END IF;
+
+  INSERT INTO sp3_tenant_bootstrap_versions (company_id)
+  VALUES (v_company_id)
+  ON CONFLICT (company_id) DO NOTHING;
+
+  SELECT version INTO v_version
+  FROM sp3_tenant_bootstrap_versions
+  WHERE company_id = v_company_id;
+
+  IF p_known_version = v_version AND p_known_company_id = v_company_id THEN
+    RETURN jsonb_build_object(
+      'version', v_version,
+      'company_id', v_company_id,
+      'unchanged', true,
+      -- O front não guarda a chave da Evolution no localStorage: reenvia aqui
+      'evo_api_key', (
+        SELECT i.evo_api_key FROM sp3_instances i
+        WHERE i.company_id = v_company_id AND i.is_active = true
+        LIMIT 1
+      )
+    );
+  END IF;
+
+  RETURN jsonb_build_object(
+    'version', v_version,
+    'company_id', v_company_id,
+    'unchanged', false,
+    -- Só as colunas que invalidam a versão (trigger acima)
+    'user', (
+      SELECT jsonb_object_agg(key, value)
+      FROM jsonb_each(to_jsonb(v_user))
+      WHERE key IN ('id', 'email', 'company_id', 'company_name', 'nome', 'role', 'permissions', 'created_at')
+    ),
+    'company', jsonb_build_object(
+      'id', v_company.id,
+      'name', v_company.name,
+      'closing_reasons', to_jsonb(v_company)->'closing_reasons',
+      'manager_phone', to_jsonb(v_company)->>'manager_phone',
+      'features', COALESCE(v_company.features, '{}'::jsonb)
+    ),
+    'quick_messages', COALESCE((
+      SELECT jsonb_agg(to_jsonb(q) ORDER BY q.id)
+      FROM sp3_quick_messages q
+      WHERE q.company_id = v_company_id
+    ), '[]'::jsonb),
+    'instance', (
+      SELECT jsonb_build_object(
+        'evo_api_url', i.evo_api_url,
+        'evo_api_key', i.evo_api_key,
+        'instance_name', i.instance_name
+      )
+      FROM sp3_instances i
+      WHERE i.company_id = v_company_id AND i.is_active = true
+      LIMIT 1
+    ),
+    'flows', COALESCE((
+      SELECT jsonb_agg(jsonb_build_object(
+        'id', f.id,
+        'name', f.name,
+        'trigger_type', f.trigger_type,
+        'is_active', f.is_active
+      ) ORDER BY f.name)
+      FROM sp3_flows f
+      WHERE f.company_id = v_company_id AND f.is_active = true
+    ), '[]'::jsonb),
+    -- Tokens do Google ficam de fora: só o que as telas usam
+    'calendar_settings', (
+      SELECT jsonb_build_object(
+        'ai_can_schedule', cs.ai_can_schedule,
+        'default_meeting_duration', cs.default_meeting_duration,
+        'business_hours', cs.business_hours,
+        'google_calendar_id', cs.google_calendar_id
+      )
+      FROM sp3_calendar_settings cs
+      WHERE cs.company_id = v_company_id
+    )
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,395 @@
+-- =============================================================================
+-- Migration 0041: Importação em massa de leads
+--
+-- Importar a base de um cliente novo era um INSERT por linha em sp3chat, e cada
+-- linha disparava trg_trial_lead_counter (SELECT + UPDATE em sp3_subscriptions)
+-- e trg_flow_new_lead. 100k leads = horas de triggers. Agora:
+--
+--   1. O cliente (python -m leadimport) faz COPY do CSV/JSONL para
+--      sp3_lead_import_staging, tabela UNLOGGED sem índices extras
+--   2. import_leads_batch() normaliza os telefones como
+--      trigger_flow_on_external_lead (só dígitos, 55 na frente), remove
+--      duplicatas do arquivo (também entre lotes, via sp3_lead_import_phones)
+--      e faz um único INSERT ... ON CONFLICT (telefone, company_id)
+--   3. Os triggers por linha de sp3chat ficam desligados durante o lote
+--      (sp3.bulk_import = 'on', local à transação); o contador de trial é
+--      atualizado uma vez por lote e os fluxos são enfileirados num único
+--      INSERT ... SELECT em sp3_flow_executions
+--
+-- O realtime do Supabase lê o WAL: cada linha importada continua virando um
+-- evento INSERT/UPDATE de sp3chat em toda tela aberta da empresa. O App junta
+-- esses eventos num buffer e, numa rajada, faz um único fetchLeads() quando
+-- os eventos param, em vez de aplicar um por um.
+-- =============================================================================
+
+-- 1. Normalização de telefone (mesma regra de trigger_flow_on_external_lead)
+CREATE OR REPLACE FUNCTION sp3_normalize_phone(p_phone TEXT)
+RETURNS TEXT AS $$
+  SELECT CASE
+    WHEN d = '' THEN NULL
+    WHEN length(d) <= 11 THEN '55' || d
+    ELSE d
+  END
+  FROM (SELECT regexp_replace(COALESCE(p_phone, ''), '[^0-9]', '', 'g') AS d) s;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 2. Controle das importações
+CREATE TABLE IF NOT EXISTS sp3_lead_imports (
+  id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  company_id      UUID NOT NULL REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  source          TEXT,
+  status          TEXT NOT NULL DEFAULT 'staging' CHECK (status IN ('staging', 'done')),
+  batches         INT NOT NULL DEFAULT 0,
+  rows_staged     INT NOT NULL DEFAULT 0,
+  inserted        INT NOT NULL DEFAULT 0,
+  updated         INT NOT NULL DEFAULT 0,
+  unchanged       INT NOT NULL DEFAULT 0,
+  invalid_phone   INT NOT NULL DEFAULT 0,
+  duplicates      INT NOT NULL DEFAULT 0,      -- mesmo telefone repetido no arquivo
+  flows_enqueued  INT NOT NULL DEFAULT 0,
+  expected_rows   INT,                         -- linhas do arquivo, se o cliente souber
+  spread_base_at  TIMESTAMPTZ,                 -- início da janela de p_spread_minutes
+  spread_rows     INT,                         -- linhas que a janela cobre
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  finished_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_lead_imports_company ON sp3_lead_imports (company_id, created_at DESC);
+
+ALTER TABLE sp3_lead_imports ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Isolate sp3_lead_imports" ON sp3_lead_imports;
+CREATE POLICY "Isolate sp3_lead_imports" ON sp3_lead_imports
+  FOR SELECT USING (company_id = get_my_company_id() OR is_master_admin());
+
+-- 3. Staging: UNLOGGED, sem RLS para usuários (só o cliente com acesso direto
+-- ao Postgres escreve aqui)
+CREATE UNLOGGED TABLE IF NOT EXISTS sp3_lead_import_staging (
+  import_id      UUID NOT NULL,
+  line_no        BIGINT NOT NULL,
+  nome           TEXT,
+  telefone       TEXT,
+  stage          TEXT,
+  observacoes    TEXT,
+  instance_name  TEXT,
+  ia_active      BOOLEAN,
+  custom_fields  JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_lead_import_staging ON sp3_lead_import_staging (import_id);
+
+ALTER TABLE sp3_lead_import_staging ENABLE ROW LEVEL SECURITY;
+
+-- Telefones já gravados pela importação (lotes anteriores): telefone repetido
+-- em outro lote conta como duplicata e a última linha vence também entre lotes.
+-- inserted = o lead foi criado por esta importação.
+CREATE UNLOGGED TABLE IF NOT EXISTS sp3_lead_import_phones (
+  import_id  UUID NOT NULL,
+  phone      TEXT NOT NULL,
+  inserted   BOOLEAN NOT NULL,
+  PRIMARY KEY (import_id, phone)
+);
+
+ALTER TABLE sp3_lead_import_phones ENABLE ROW LEVEL SECURITY;
+
+-- 4. Triggers por linha de sp3chat ignoram linhas de importação em massa
+DROP TRIGGER IF EXISTS trg_trial_lead_counter ON sp3chat;
+CREATE TRIGGER trg_trial_lead_counter
+  AFTER INSERT ON sp3chat
+  FOR EACH ROW
+  WHEN (current_setting('sp3.bulk_import', true) IS DISTINCT FROM 'on')
+  EXECUTE FUNCTION trg_count_trial_lead();
+
+DROP TRIGGER IF EXISTS trg_flow_new_lead ON sp3chat;
+CREATE TRIGGER trg_flow_new_lead
+  AFTER INSERT ON sp3chat
+  FOR EACH ROW
+  WHEN (current_setting('sp3.bulk_import', true) IS DISTINCT FROM 'on')
+  EXECUTE FUNCTION trigger_flow_on_new_lead();
+
+-- 5. Abrir uma importação. p_expected_rows (total de linhas do arquivo) é o
+-- que permite p_spread_minutes cobrir a importação inteira, e não cada lote.
+DROP FUNCTION IF EXISTS begin_lead_import(UUID, TEXT);
+CREATE OR REPLACE FUNCTION begin_lead_import(
+  p_company_id UUID,
+  p_source TEXT DEFAULT NULL,
+  p_expected_rows INT DEFAULT NULL
+)
+RETURNS UUID AS $$
+DECLARE
+  v_id UUID;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM sp3_companies WHERE id = p_company_id) THEN
+    RAISE EXCEPTION 'Empresa não encontrada: %', p_company_id;
+  END IF;
+
+  INSERT INTO sp3_lead_imports (company_id, source, expected_rows)
+  VALUES (p_company_id, p_source, p_expected_rows)
+  RETURNING id INTO v_id;
+
+  RETURN v_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 6. Processar o que está no staging para a importação
+--   p_update_existing : completa nome/observações/campos de leads já existentes
+--   p_new_lead_flows  : enfileira os fluxos 'new_lead' ativos (o que o trigger faria)
+--   p_flow_id         : enfileira também este fluxo para todos os leads do lote
+--   p_spread_minutes  : distribui o next_run_at das execuções ao longo de N
+--                       minutos para não despejar a importação na Evolution.
+--                       A janela começa no primeiro lote e cada lead ocupa a
+--                       posição da sua linha no arquivo (line_no / expected_rows),
+--                       então lotes seguintes continuam de onde o anterior parou.
+--                       Sem expected_rows (stdin), vale o ritmo do primeiro lote
+-- Pode ser chamada várias vezes na mesma importação (um COPY por lote); a
+-- importação só vira 'done' em finish_lead_import().
+CREATE OR REPLACE FUNCTION import_leads_batch(
+  p_import_id UUID,
+  p_update_existing BOOLEAN DEFAULT true,
+  p_new_lead_flows BOOLEAN DEFAULT false,
+  p_flow_id BIGINT DEFAULT NULL,
+  p_spread_minutes INT DEFAULT 0
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_import RECORD;
+  v_staged INT;
+  v_valid INT;
+  v_distinct INT;
+  v_seen INT;
+  v_inserted INT;
+  v_updated INT;
+  v_enqueued INT := 0;
+  v_sub RECORD;
+BEGIN
+  SELECT * INTO v_import FROM sp3_lead_imports WHERE id = p_import_id FOR UPDATE;
+  IF v_import.id IS NULL THEN
+    RAISE EXCEPTION 'Importação não encontrada: %', p_import_id;
+  END IF;
+  IF v_import.status = 'done' THEN
+    RAISE EXCEPTION 'Importação % já foi finalizada', p_import_id;
+  END IF;
+
+  IF p_flow_id IS NOT NULL AND NOT EXISTS (
+    SELECT 1 FROM sp3_flows
+    WHERE id = p_flow_id AND company_id = v_import.company_id AND is_active = true
+  ) THEN
+    RAISE EXCEPTION 'Fluxo % não existe, não está ativo ou é de outra empresa', p_flow_id;
+  END IF;
+
+  -- Desliga trg_trial_lead_counter / trg_flow_new_lead até o fim da transação
+  PERFORM set_config('sp3.bulk_import', 'on', true);
+
+  SELECT count(*) INTO v_staged FROM sp3_lead_import_staging WHERE import_id = p_import_id;
+
+  -- Janela do espalhamento: fixada no primeiro lote, vale para a importação toda
+  IF p_spread_minutes > 0 AND v_import.spread_base_at IS NULL THEN
+    UPDATE sp3_lead_imports
+    SET spread_base_at = NOW(),
+        spread_rows = GREATEST(COALESCE(expected_rows, v_staged), 1)
+    WHERE id = p_import_id
+    RETURNING * INTO v_import;
+  END IF;
+
+  -- Normaliza e deduplica (última linha do arquivo vence). seen = telefone já
+  -- gravado por um lote anterior desta importação.
+  DROP TABLE IF EXISTS _lead_import_rows;
+  DROP TABLE IF EXISTS _lead_import_result;
+  CREATE TEMP TABLE _lead_import_rows ON COMMIT DROP AS
+  SELECT d.*, p.phone IS NOT NULL AS seen, COALESCE(p.inserted, false) AS seen_inserted
+  FROM (
+    SELECT DISTINCT ON (phone)
+      phone,
+      s.line_no,
+      NULLIF(btrim(s.nome), '')          AS nome,
+      COALESCE(NULLIF(btrim(s.stage), ''), 'Novo Lead') AS stage,
+      NULLIF(btrim(s.observacoes), '')   AS observacoes,
+      NULLIF(btrim(s.instance_name), '') AS instance_name,
+      COALESCE(s.ia_active, true)        AS ia_active,
+      COALESCE(s.custom_fields, '{}'::jsonb) AS custom_fields
+    FROM sp3_lead_import_staging s
+    CROSS JOIN LATERAL (SELECT sp3_normalize_phone(s.telefone) AS phone) n
+    WHERE s.import_id = p_import_id
+      AND n.phone IS NOT NULL
+    ORDER BY phone, s.line_no DESC
+  ) d
+  LEFT JOIN sp3_lead_import_phones p ON p.import_id = p_import_id AND p.phone = d.phone;
+
+  SELECT count(*) INTO v_valid
+  FROM sp3_lead_import_staging
+  WHERE import_id = p_import_id AND sp3_normalize_phone(telefone) IS NOT NULL;
+
+  SELECT count(*), count(*) FILTER (WHERE seen) INTO v_distinct, v_seen FROM _lead_import_rows;
+
+  -- Upsert em conjunto. xmax = 0 identifica linhas novas no RETURNING.
+  CREATE TEMP TABLE _lead_import_result (
+    id BIGINT, telefone TEXT, inserted BOOLEAN
+  ) ON COMMIT DROP;
+
+  WITH upserted AS (
+    INSERT INTO sp3chat AS c (
+      company_id, nome, telefone, stage, ia_active, observacoes,
+      instance_name, custom_fields, created_at
+    )
+    SELECT
+      v_import.company_id, r.nome, r.phone, r.stage, r.ia_active, r.observacoes,
+      r.instance_name, r.custom_fields, NOW()
+    FROM _lead_import_rows r
+    WHERE NOT r.seen
+    ON CONFLICT (telefone, company_id) DO UPDATE SET
+      nome          = COALESCE(EXCLUDED.nome, c.nome),
+      observacoes   = COALESCE(c.observacoes, EXCLUDED.observacoes),
+      instance_name = COALESCE(c.instance_name, EXCLUDED.instance_name),
+      custom_fields = COALESCE(c.custom_fields, '{}'::jsonb) || EXCLUDED.custom_fields
+    WHERE p_update_existing
+      AND (c.nome IS DISTINCT FROM COALESCE(EXCLUDED.nome, c.nome)
+        OR (c.observacoes IS NULL AND EXCLUDED.observacoes IS NOT NULL)
+        OR (c.instance_name IS NULL AND EXCLUDED.instance_name IS NOT NULL)
+        OR NOT COALESCE(c.custom_fields, '{}'::jsonb) @> EXCLUDED.custom_fields)
+    RETURNING c.id, c.telefone, (c.xmax = 0) AS inserted
+  )
+  INSERT INTO _lead_import_result SELECT * FROM upserted;
+
+  -- Telefone repetido de lote anterior: a linha nova vence. Lead criado por
+  -- esta importação fica igual à última linha; lead que já existia recebe a
+  -- mesma complementação do upsert (e nada com p_update_existing = false).
+  UPDATE sp3chat c SET
+    nome          = CASE WHEN r.seen_inserted THEN r.nome ELSE COALESCE(r.nome, c.nome) END,
+    stage         = CASE WHEN r.seen_inserted THEN r.stage ELSE c.stage END,
+    ia_active     = CASE WHEN r.seen_inserted THEN r.ia_active ELSE c.ia_active END,
+    observacoes   = CASE WHEN r.seen_inserted THEN r.observacoes ELSE COALESCE(c.observacoes, r.observacoes) END,
+    instance_name = CASE WHEN r.seen_inserted THEN r.instance_name ELSE COALESCE(c.instance_name, r.instance_name) END,
+    custom_fields = CASE WHEN r.seen_inserted THEN r.custom_fields
+                         ELSE COALESCE(c.custom_fields, '{}'::jsonb) || r.custom_fields END
+  FROM _lead_import_rows r
+  WHERE r.seen
+    AND (r.seen_inserted OR p_update_existing)
+    AND c.company_id = v_import.company_id AND c.telefone = r.phone;
+
+  INSERT INTO sp3_lead_import_phones (import_id, phone, inserted)
+  SELECT p_import_id, r.phone, COALESCE(res.inserted, false)
+  FROM _lead_import_rows r
+  LEFT JOIN _lead_import_result res ON res.telefone = r.phone
+  WHERE NOT r.seen;
+
+  SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+  INTO v_inserted, v_updated
+  FROM _lead_import_result;
+
+  -- Contador de trial: uma vez por lote (mesma regra de trg_count_trial_lead)
+  IF v_inserted > 0 THEN
+    UPDATE sp3_subscriptions
+    SET trial_leads_used = trial_leads_used + v_inserted, updated_at = NOW()
+    WHERE company_id = v_import.company_id AND status = 'trialing'
+    RETURNING * INTO v_sub;
+
+    IF v_sub.company_id IS NOT NULL AND v_sub.trial_leads_used > v_sub.trial_lead_limit THEN
+      UPDATE sp3_subscriptions
+      SET status = 'blocked', blocked_at = NOW(), blocked_reason = 'trial_leads_exhausted', updated_at = NOW()
+      WHERE company_id = v_import.company_id;
+
+      UPDATE sp3_companies SET active = false WHERE id = v_import.company_id;
+    END IF;
+  END IF;
+
+  -- Fluxos em massa: new_lead só para leads novos, p_flow_id para o lote todo
+  -- (inclusive leads existentes que o upsert não alterou, por isso o JOIN com
+  -- sp3chat em vez de só _lead_import_result). Telefone de lote anterior já
+  -- foi enfileirado lá.
+  IF p_new_lead_flows OR p_flow_id IS NOT NULL THEN
+    WITH targets AS (
+      SELECT c.id AS lead_id, c.telefone, f.id AS flow_id, f.company_id,
+             (SELECT n->>'id' FROM jsonb_array_elements(f.flow_data->'nodes') AS n
+              WHERE n->>'type' = 'trigger' LIMIT 1) AS trigger_node_id,
+             ir.line_no
+      FROM _lead_import_rows ir
+      JOIN sp3chat c
+        ON c.telefone = ir.phone AND c.company_id = v_import.company_id
+      LEFT JOIN _lead_import_result r ON r.id = c.id
+      JOIN sp3_flows f
+        ON f.company_id = v_import.company_id
+       AND f.is_active = true
+       AND ((p_new_lead_flows AND COALESCE(r.inserted, false) AND f.trigger_type = 'new_lead')
+            OR f.id = p_flow_id)
+      WHERE NOT ir.seen
+    )
+    INSERT INTO sp3_flow_executions (
+      company_id, flow_id, lead_id, current_node_id, next_run_at, status, execution_log
+    )
+    SELECT
+      t.company_id, t.flow_id, t.lead_id, t.trigger_node_id,
+      CASE WHEN p_spread_minutes > 0
+        THEN v_import.spread_base_at
+             + make_interval(secs => (p_spread_minutes * 60.0) * (t.line_no - 1) / v_import.spread_rows)
+        ELSE NOW()
+      END,
+      'running',
+      jsonb_build_array(jsonb_build_object(
+        'node_id', t.trigger_node_id,
+        'action', 'Gatilho disparado — Importação de leads',
+        'timestamp', NOW()::text,
+        'result', 'Tel: ' || t.telefone
+      ))
+    FROM targets t
+    WHERE t.trigger_node_id IS NOT NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM sp3_flow_executions e
+        WHERE e.flow_id = t.flow_id AND e.lead_id = t.lead_id AND e.status IN ('running', 'paused')
+      );
+
+    GET DIAGNOSTICS v_enqueued = ROW_COUNT;
+  END IF;
+
+  DELETE FROM sp3_lead_import_staging WHERE import_id = p_import_id;
+
+  UPDATE sp3_lead_imports SET
+    batches        = batches + 1,
+    rows_staged    = rows_staged + v_staged,
+    inserted       = inserted + v_inserted,
+    updated        = updated + v_updated,
+    unchanged      = unchanged + (v_distinct - v_seen - v_inserted - v_updated),
+    invalid_phone  = invalid_phone + (v_staged - v_valid),
+    duplicates     = duplicates + (v_valid - v_distinct + v_seen),
+    flows_enqueued = flows_enqueued + v_enqueued
+  WHERE id = p_import_id;
+
+  RETURN jsonb_build_object(
+    'import_id', p_import_id,
+    'rows', v_staged,
+    'inserted', v_inserted,
+    'updated', v_updated,
+    'unchanged', v_distinct - v_seen - v_inserted - v_updated,
+    'invalid_phone', v_staged - v_valid,
+    'duplicates', v_valid - v_distinct + v_seen,
+    'flows_enqueued', v_enqueued
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 7. Fechar a importação depois do último lote
+CREATE OR REPLACE FUNCTION finish_lead_import(p_import_id UUID)
+RETURNS JSONB AS $$
+DECLARE
+  v_import RECORD;
+BEGIN
+  UPDATE sp3_lead_imports
+  SET status = 'done', finished_at = NOW()
+  WHERE id = p_import_id AND status = 'staging'
+  RETURNING * INTO v_import;
+
+  IF v_import.id IS NULL THEN
+    RAISE EXCEPTION 'Importação não encontrada ou já finalizada: %', p_import_id;
+  END IF;
+
+  -- Lote abortado pelo cliente não deixa lixo no staging
+  DELETE FROM sp3_lead_import_staging WHERE import_id = p_import_id;
+  DELETE FROM sp3_lead_import_phones WHERE import_id = p_import_id;
+
+  RETURN to_jsonb(v_import);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Só o cliente de importação (conexão direta com service role/postgres) chama
+REVOKE EXECUTE ON FUNCTION begin_lead_import(UUID, TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION import_leads_batch(UUID, BOOLEAN, BOOLEAN, BIGINT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION finish_lead_import(UUID) FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,392 @@
+-- =============================================================================
+-- Migration 0042: Matcher compilado de palavras-chave do Instagram
+--
+-- Cada comentário era comparado com todas as automações ativas do post, uma a
+-- uma, com busca de substring. Em post viral (milhares de comentários/hora)
+-- isso vira uma varredura de tabela por comentário e uma rajada de DMs para
+-- quem comenta várias vezes. Agora:
+--
+--   1. keyword_norm: palavra-chave em minúsculas, sem acento e sem pontuação
+--      (o InstagramView grava em MAIÚSCULAS; o comentário passa pela mesma
+--      normalização) + match_mode 'contains' | 'whole_word'
+--   2. sp3_instagram_matchers: autômato Aho-Corasick por (empresa, post) com
+--      todas as palavras-chave ativas, reconstruído por trigger sempre que uma
+--      automação do post muda
+--   3. match_instagram_comment(): uma passada no texto do comentário devolve
+--      todas as automações que casaram, já com a sequência de mensagens
+--   4. sp3_instagram_comment_dedupe: o mesmo usuário só recebe a DM de uma
+--      automação de novo depois de dedupe_window_minutes (padrão 24h), a não
+--      ser que a última DM para ele tenha falhado (status 'failed' no dm_log)
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- 1. Normalização (comentário e palavra-chave)
+CREATE OR REPLACE FUNCTION sp3_normalize_match_text(p_text TEXT)
+RETURNS TEXT AS $$
+  SELECT btrim(regexp_replace(lower(unaccent(COALESCE(p_text, ''))), '[[:space:][:punct:]]+', ' ', 'g'));
+$$ LANGUAGE sql STABLE;
+
+ALTER TABLE sp3_instagram_automations
+  ADD COLUMN IF NOT EXISTS keyword_norm TEXT,
+  ADD COLUMN IF NOT EXISTS match_mode TEXT NOT NULL DEFAULT 'contains',
+  ADD COLUMN IF NOT EXISTS dedupe_window_minutes INT NOT NULL DEFAULT 1440;
+
+DO $$ BEGIN
+  ALTER TABLE sp3_instagram_automations
+    ADD CONSTRAINT sp3_ig_automations_match_mode CHECK (match_mode IN ('contains', 'whole_word'));
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Janela máxima de 30 dias: é o que purge_instagram_comment_dedupe() mantém
+DO $$ BEGIN
+  ALTER TABLE sp3_instagram_automations
+    ADD CONSTRAINT sp3_ig_automations_dedupe_window CHECK (dedupe_window_minutes BETWEEN 0 AND 43200);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION sp3_ig_automation_normalize()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.keyword_norm := sp3_normalize_match_text(NEW.keyword);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ig_automation_normalize ON sp3_instagram_automations;
+CREATE TRIGGER trg_ig_automation_normalize
+  BEFORE INSERT OR UPDATE OF keyword ON sp3_instagram_automations
+  FOR EACH ROW
+  EXECUTE FUNCTION sp3_ig_automation_normalize();
+
+UPDATE sp3_instagram_automations SET keyword_norm = sp3_normalize_match_text(keyword);
+
+-- 2. Autômato por post
+--   goto     : array de objetos, goto[estado][caractere] = próximo estado
+--   fail     : link de falha de cada estado (índice 1 = estado 0)
+--   outputs  : por estado, índices em patterns que terminam ali (já inclui
+--              os herdados pelos links de falha)
+--   patterns : [{automation_id, len, whole_word}]
+CREATE TABLE IF NOT EXISTS sp3_instagram_matchers (
+  company_id   UUID NOT NULL REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  post_id      TEXT NOT NULL,
+  goto         JSONB NOT NULL,
+  fail         INT[] NOT NULL,
+  outputs      JSONB NOT NULL,
+  patterns     JSONB NOT NULL,
+  version      BIGINT NOT NULL DEFAULT 1,
+  built_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (company_id, post_id)
+);
+
+ALTER TABLE sp3_instagram_matchers ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Isolate sp3_instagram_matchers" ON sp3_instagram_matchers;
+CREATE POLICY "Isolate sp3_instagram_matchers" ON sp3_instagram_matchers
+  FOR SELECT USING (company_id = get_my_company_id() OR is_master_admin());
+
+CREATE OR REPLACE FUNCTION sp3_build_ig_matcher(p_company_id UUID, p_post_id TEXT)
+RETURNS VOID AS $$
+DECLARE
+  v_goto JSONB[] := ARRAY['{}'::jsonb];
+  v_out JSONB[] := ARRAY['[]'::jsonb];
+  v_fail INT[];
+  v_patterns JSONB := '[]'::jsonb;
+  v_queue INT[] := '{}';
+  v_head INT := 1;
+  v_pidx INT;
+  v_state INT;
+  v_next INT;
+  v_f INT;
+  v_ch TEXT;
+  r RECORD;
+  e RECORD;
+BEGIN
+  -- Serializa rebuilds do mesmo post: sem o lock, dois saves concorrentes
+  -- leem snapshots sem a keyword um do outro e o último upsert apaga uma delas.
+  -- Em READ COMMITTED a leitura abaixo (depois do lock) já vê o commit do outro.
+  PERFORM pg_advisory_xact_lock(hashtext(p_company_id::text || ':' || p_post_id));
+
+  -- Trie com todas as palavras-chave ativas do post
+  FOR r IN
+    SELECT id, keyword_norm, match_mode
+    FROM sp3_instagram_automations
+    WHERE company_id = p_company_id AND post_id = p_post_id
+      AND active = true AND COALESCE(keyword_norm, '') <> ''
+    ORDER BY id
+  LOOP
+    v_pidx := jsonb_array_length(v_patterns);
+    v_patterns := v_patterns || jsonb_build_array(jsonb_build_object(
+      'automation_id', r.id,
+      'len', char_length(r.keyword_norm),
+      'whole_word', r.match_mode = 'whole_word'
+    ));
+
+    v_state := 0;
+    FOREACH v_ch IN ARRAY string_to_array(r.keyword_norm, NULL) LOOP
+      v_next := (v_goto[v_state + 1] ->> v_ch)::int;
+      IF v_next IS NULL THEN
+        v_next := array_length(v_goto, 1);
+        v_goto[v_state + 1] := v_goto[v_state + 1] || jsonb_build_object(v_ch, v_next);
+        v_goto := array_append(v_goto, '{}'::jsonb);
+        v_out := array_append(v_out, '[]'::jsonb);
+      END IF;
+      v_state := v_next;
+    END LOOP;
+
+    v_out[v_state + 1] := v_out[v_state + 1] || to_jsonb(v_pidx);
+  END LOOP;
+
+  IF jsonb_array_length(v_patterns) = 0 THEN
+    DELETE FROM sp3_instagram_matchers WHERE company_id = p_company_id AND post_id = p_post_id;
+    RETURN;
+  END IF;
+
+  -- Links de falha em BFS (filhos da raiz falham para a raiz)
+  v_fail := array_fill(0, ARRAY[array_length(v_goto, 1)]);
+  FOR e IN SELECT value::int AS child FROM jsonb_each_text(v_goto[1]) LOOP
+    v_queue := array_append(v_queue, e.child);
+  END LOOP;
+
+  WHILE v_head <= COALESCE(array_length(v_queue, 1), 0) LOOP
+    v_state := v_queue[v_head];
+    v_head := v_head + 1;
+
+    FOR e IN SELECT key, value::int AS child FROM jsonb_each_text(v_goto[v_state + 1]) LOOP
+      v_queue := array_append(v_queue, e.child);
+
+      v_f := v_fail[v_state + 1];
+      WHILE v_f > 0 AND NOT (v_goto[v_f + 1] ? e.key) LOOP
+        v_f := v_fail[v_f + 1];
+      END LOOP;
+      v_f := COALESCE((v_goto[v_f + 1] ->> e.key)::int, 0);
+
+      v_fail[e.child + 1] := v_f;
+      v_out[e.child + 1] := v_out[e.child + 1] || v_out[v_f + 1];
+    END LOOP;
+  END LOOP;
+
+  INSERT INTO sp3_instagram_matchers (company_id, post_id, goto, fail, outputs, patterns, version, built_at)
+  VALUES (p_company_id, p_post_id, to_jsonb(v_goto), v_fail, to_jsonb(v_out), v_patterns, 1, NOW())
+  ON CONFLICT (company_id, post_id) DO UPDATE SET
+    goto = EXCLUDED.goto,
+    fail = EXCLUDED.fail,
+    outputs = EXCLUDED.outputs,
+    patterns = EXCLUDED.patterns,
+    version = sp3_instagram_matchers.version + 1,
+    built_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION sp3_ig_automation_rebuild_matcher()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    PERFORM sp3_build_ig_matcher(OLD.company_id, OLD.post_id);
+  END IF;
+  IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT'
+      OR OLD.company_id IS DISTINCT FROM NEW.company_id
+      OR OLD.post_id IS DISTINCT FROM NEW.post_id) THEN
+    PERFORM sp3_build_ig_matcher(NEW.company_id, NEW.post_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Só colunas que mudam o autômato disparam rebuild
+DROP TRIGGER IF EXISTS trg_ig_automation_rebuild_matcher ON sp3_instagram_automations;
+CREATE TRIGGER trg_ig_automation_rebuild_matcher
+  AFTER INSERT OR DELETE OR UPDATE OF keyword, match_mode, active, post_id, company_id
+  ON sp3_instagram_automations
+  FOR EACH ROW
+  EXECUTE FUNCTION sp3_ig_automation_rebuild_matcher();
+
+-- Compilar os posts que já têm automação
+DO $$
+DECLARE
+  r RECORD;
+BEGIN
+  FOR r IN SELECT DISTINCT company_id, post_id FROM sp3_instagram_automations LOOP
+    PERFORM sp3_build_ig_matcher(r.company_id, r.post_id);
+  END LOOP;
+END $$;
+
+-- 3. Dedupe de quem comenta repetidamente
+CREATE TABLE IF NOT EXISTS sp3_instagram_comment_dedupe (
+  automation_id       BIGINT NOT NULL REFERENCES sp3_instagram_automations(id) ON DELETE CASCADE,
+  ig_user_id          TEXT NOT NULL,
+  company_id          UUID NOT NULL REFERENCES sp3_companies(id) ON DELETE CASCADE,
+  last_dispatched_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  last_comment_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  hits                INT NOT NULL DEFAULT 1,
+  PRIMARY KEY (automation_id, ig_user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ig_comment_dedupe_last ON sp3_instagram_comment_dedupe (last_comment_at);
+
+ALTER TABLE sp3_instagram_comment_dedupe ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Isolate sp3_instagram_comment_dedupe" ON sp3_instagram_comment_dedupe;
+CREATE POLICY "Isolate sp3_instagram_comment_dedupe" ON sp3_instagram_comment_dedupe
+  FOR ALL USING (company_id = get_my_company_id() OR is_master_admin());
+
+-- 4. RPC chamada pelo webhook de comentários
+-- Retorna { matched: [ids], dispatch: [automação + mensagens], suppressed: [ids] }.
+-- Comentários da própria conta (o reply_comment_text) nunca disparam.
+CREATE OR REPLACE FUNCTION match_instagram_comment(
+  p_company_id UUID,
+  p_post_id TEXT,
+  p_ig_user_id TEXT,
+  p_comment_id TEXT,
+  p_text TEXT
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_goto JSONB;
+  v_fail INT[];
+  v_outputs JSONB;
+  v_patterns JSONB;
+  v_chars TEXT[];
+  v_ch TEXT;
+  v_i INT := 0;
+  v_state INT := 0;
+  v_next INT;
+  v_pidx INT;
+  v_pattern JSONB;
+  v_start INT;
+  v_matched BIGINT[] := '{}';
+  v_dispatch_ids BIGINT[] := '{}';
+  v_suppressed BIGINT[] := '{}';
+  v_total INT;
+  v_dispatch BOOLEAN;
+  v_retry BOOLEAN;
+  r RECORD;
+BEGIN
+  SELECT goto, fail, outputs, patterns
+  INTO v_goto, v_fail, v_outputs, v_patterns
+  FROM sp3_instagram_matchers
+  WHERE company_id = p_company_id AND post_id = p_post_id;
+
+  IF v_goto IS NULL THEN
+    RETURN jsonb_build_object('matched', '[]'::jsonb, 'dispatch', '[]'::jsonb, 'suppressed', '[]'::jsonb);
+  END IF;
+
+  v_total := jsonb_array_length(v_patterns);
+
+  -- Espaços nas pontas: whole_word checa o caractere antes/depois do match
+  v_chars := string_to_array(' ' || sp3_normalize_match_text(p_text) || ' ', NULL);
+
+  FOREACH v_ch IN ARRAY v_chars LOOP
+    v_i := v_i + 1;
+
+    LOOP
+      v_next := (v_goto -> v_state ->> v_ch)::int;
+      EXIT WHEN v_next IS NOT NULL OR v_state = 0;
+      v_state := v_fail[v_state + 1];
+    END LOOP;
+    v_state := COALESCE(v_next, 0);
+
+    IF v_outputs -> v_state <> '[]'::jsonb THEN
+      FOR v_pidx IN SELECT value::int FROM jsonb_array_elements_text(v_outputs -> v_state) LOOP
+        v_pattern := v_patterns -> v_pidx;
+        CONTINUE WHEN (v_pattern ->> 'automation_id')::bigint = ANY (v_matched);
+
+        IF (v_pattern ->> 'whole_word')::boolean THEN
+          v_start := v_i - (v_pattern ->> 'len')::int + 1;
+          CONTINUE WHEN v_chars[v_start - 1] <> ' ' OR v_chars[v_i + 1] <> ' ';
+        END IF;
+
+        v_matched := array_append(v_matched, (v_pattern ->> 'automation_id')::bigint);
+      END LOOP;
+
+      EXIT WHEN array_length(v_matched, 1) = v_total;
+    END IF;
+  END LOOP;
+
+  IF array_length(v_matched, 1) IS NULL THEN
+    RETURN jsonb_build_object('matched', '[]'::jsonb, 'dispatch', '[]'::jsonb, 'suppressed', '[]'::jsonb);
+  END IF;
+
+  -- Dedupe: só dispara se nunca disparou para este usuário, se a janela passou
+  -- ou se a última DM dessa automação para ele falhou. A janela é marcada aqui,
+  -- antes do envio; sem o retry, uma falha calaria o usuário por até 30 dias.
+  FOR r IN
+    SELECT a.id, a.dedupe_window_minutes
+    FROM sp3_instagram_automations a
+    JOIN sp3_instagram_accounts acc ON acc.id = a.instagram_account_id
+    WHERE a.id = ANY (v_matched)
+      AND a.active = true
+      AND acc.ig_user_id IS DISTINCT FROM p_ig_user_id
+  LOOP
+    v_retry := COALESCE((
+      SELECT status = 'failed'
+      FROM sp3_instagram_dm_log
+      WHERE automation_id = r.id AND ig_user_id = p_ig_user_id
+      ORDER BY sent_at DESC, id DESC
+      LIMIT 1
+    ), false);
+
+    INSERT INTO sp3_instagram_comment_dedupe AS d (automation_id, ig_user_id, company_id)
+    VALUES (r.id, p_ig_user_id, p_company_id)
+    ON CONFLICT (automation_id, ig_user_id) DO UPDATE SET
+      hits = d.hits + 1,
+      last_comment_at = NOW(),
+      last_dispatched_at = CASE
+        WHEN v_retry OR d.last_dispatched_at <= NOW() - make_interval(mins => r.dedupe_window_minutes) THEN NOW()
+        ELSE d.last_dispatched_at
+      END
+    RETURNING (d.last_dispatched_at = NOW()) INTO v_dispatch;
+
+    -- Comentário reentregue pelo webhook conta como já enviado
+    IF v_dispatch AND NOT EXISTS (
+      SELECT 1 FROM sp3_instagram_dm_log
+      WHERE automation_id = r.id AND ig_user_id = p_ig_user_id AND comment_id = p_comment_id
+    ) THEN
+      v_dispatch_ids := array_append(v_dispatch_ids, r.id);
+    ELSE
+      v_suppressed := array_append(v_suppressed, r.id);
+    END IF;
+  END LOOP;
+
+  RETURN jsonb_build_object(
+    'matched', to_jsonb(v_matched),
+    'suppressed', to_jsonb(v_suppressed),
+    'dispatch', COALESCE((
+      SELECT jsonb_agg(jsonb_build_object(
+        'automation_id', a.id,
+        'name', a.name,
+        'keyword', a.keyword,
+        'instagram_account_id', a.instagram_account_id,
+        'reply_comment', a.reply_comment,
+        'reply_comment_text', a.reply_comment_text,
+        'messages', COALESCE((
+          SELECT jsonb_agg(to_jsonb(m) - 'company_id' ORDER BY m.sort_order)
+          FROM sp3_instagram_automation_messages m
+          WHERE m.automation_id = a.id
+        ), '[]'::jsonb)
+      ) ORDER BY a.id)
+      FROM sp3_instagram_automations a
+      WHERE a.id = ANY (v_dispatch_ids)
+    ), '[]'::jsonb)
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Chamada só pelo webhook (service role)
+REVOKE EXECUTE ON FUNCTION match_instagram_comment(UUID, TEXT, TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+
+-- 5. Limpeza diária do dedupe (janela máxima é 30 dias)
+CREATE OR REPLACE FUNCTION purge_instagram_comment_dedupe()
+RETURNS INT AS $$
+DECLARE
+  v_deleted INT;
+BEGIN
+  DELETE FROM sp3_instagram_comment_dedupe
+  WHERE last_comment_at < NOW() - INTERVAL '30 days';
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DO $$ BEGIN PERFORM cron.unschedule('purge-instagram-comment-dedupe'); EXCEPTION WHEN OTHERS THEN NULL; END $$;
+SELECT cron.schedule('purge-instagram-comment-dedupe', '30 3 * * *', 'SELECT purge_instagram_comment_dedupe()');